@@ -1,9 +1,17 @@
 import time
 import random
+import asyncio
+import socket
+import ssl
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import ipaddress
 import subprocess
 import os
+import platform
+from pathlib import Path
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -14,13 +22,23 @@ from app.core.config import settings
 from app.core.event import eventmanager, Event
 from app.schemas.types import EventType
 from app.schemas import NotificationType
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, Callable, List, Dict, Tuple, Optional
 import shutil
+import tempfile
 import urllib.request
 import zipfile, tarfile
+import zlib
 import json
+import re
+import hashlib
+import struct
+import bisect
+import heapq
+import itertools
+from array import array
 from collections import defaultdict
-from .ikuai_dns_manager import IkuaiDNSManager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .ikuai_dns_manager import IkuaiDNSManager, get_dns_manager
 
 # 尝试导入psutil，如果不可用则使用备选方案
 try:
@@ -30,11 +48,183 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     logger.warning("psutil未安装，将无法监控内存使用情况")
 
+# 尝试导入uvloop，可用时用于加速并发探测的事件循环
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+# 尝试导入ijson，可用时流式解析列表格式的locations_raw.json
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+_V4_STRUCT = struct.Struct('>I')
+
+# hosts中插件维护的区块：标记行及其后紧跟的非注释、非空行
+_HOSTS_BLOCK_MARK = "# CFIPSelector优选IP"
+_HOSTS_BLOCK_RE = re.compile(r"^# CFIPSelector优选IP[ \t]*(?:\n|\Z)(?:[^#\s][^\n]*(?:\n|\Z))*", re.MULTILINE)
+# 优选IP区块中至少有一条IPv4/IPv6条目
+_HOSTS_ENTRY_RE = re.compile(r"^# CFIPSelector优选IP[ \t]*\n[ \t]*[0-9A-Fa-f:.]+[ \t]+\S", re.MULTILINE)
+# 旧版本测速时写入的临时区块，测速中断时可能残留在hosts中
+_HOSTS_TEMP_RE = re.compile(r"^# CFIPSelector临时测试[ \t]*(?:\n|\Z)(?:[^#\s][^\n]*(?:\n|\Z))*", re.MULTILINE)
+
+# 系统hosts文件路径，运行期间平台不会变化
+_HOSTS_PATH = r"c:\windows\system32\drivers\etc\hosts" if platform.system() == "Windows" else '/etc/hosts'
+
+# 从站点地址中提取主机名（可省略协议，去掉端口、路径）
+_NETLOC_RE = re.compile(r'^(?:https?://)?([^/:?#\s]+)', re.IGNORECASE)
+
+# 状态页检测站点芯片可选颜色
+_CHIP_COLORS = ('info', 'success', 'primary', 'warning', 'error', 'secondary')
+
+
+def _v4_to_int(ip: str) -> int:
+    """
+    IPv4点分字符串转整数，非法地址抛出OSError
+    """
+    return _V4_STRUCT.unpack(socket.inet_pton(socket.AF_INET, ip))[0]
+
+
+def _int_to_v4(value: int) -> str:
+    """
+    整数转IPv4点分字符串
+    """
+    return socket.inet_ntoa(_V4_STRUCT.pack(value))
+
+
+class _TriedIPs:
+    """
+    已尝试过的IP集合：IPv4按/24分组用32字节位图记录，IPv6记录整数地址
+    成员判断既接受IP字符串，也接受IPv4整数（IP池中的IPv4以整数存放）
+    """
+
+    def __init__(self):
+        self._v4: Dict[int, bytearray] = {}
+        self._v6: set = set()
+        self._count = 0
+
+    def add(self, ip: str):
+        if ':' in ip:
+            value = int(ipaddress.IPv6Address(ip))
+            if value not in self._v6:
+                self._v6.add(value)
+                self._count += 1
+            return
+        value = _v4_to_int(ip)
+        bitmap = self._v4.get(value >> 8)
+        if bitmap is None:
+            bitmap = self._v4[value >> 8] = bytearray(32)
+        byte, bit = (value & 0xff) >> 3, 1 << (value & 7)
+        if not bitmap[byte] & bit:
+            bitmap[byte] |= bit
+            self._count += 1
+
+    def update(self, ips):
+        for ip in ips:
+            self.add(ip)
+
+    def __contains__(self, ip) -> bool:
+        if isinstance(ip, int):
+            value = ip
+        else:
+            try:
+                if ':' in ip:
+                    return int(ipaddress.IPv6Address(ip)) in self._v6
+                value = _v4_to_int(ip)
+            except (OSError, ValueError):
+                return False
+        bitmap = self._v4.get(value >> 8)
+        return bitmap is not None and bool(bitmap[(value & 0xff) >> 3] & (1 << (value & 7)))
+
+    def __len__(self) -> int:
+        return self._count
+
+
+def _probe_socket(ip: str) -> socket.socket:
+    """
+    创建探测用的非阻塞TCP socket，关闭Nagle算法，避免小请求被延迟发送
+    """
+    s = socket.socket(socket.AF_INET6 if ':' in ip else socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        s.setblocking(False)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def _unverified_ssl_context() -> ssl.SSLContext:
+    """
+    创建不校验证书的TLS上下文，探测节点时全局共用一份，避免每次连接重复构建
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_UNVERIFIED_SSL_CONTEXT = _unverified_ssl_context()
+
+
+def _pinned_pool_class(pool_cls, ip: str, domains: frozenset):
+    """
+    生成连接池类：目标域名的TCP连接直连指定IP，Host头与TLS SNI仍为域名
+    """
+    class _PinnedConnection(pool_cls.ConnectionCls):
+        @property
+        def host(self):
+            return self._pinned_host
+
+        @host.setter
+        def host(self, value):
+            self._pinned_host = value.rstrip('.')
+            # _dns_host为urllib3实际建立连接的地址
+            self._dns_host = ip if self._pinned_host in domains else value
+
+    return type(f"Pinned{pool_cls.__name__}", (pool_cls,), {'ConnectionCls': _PinnedConnection})
+
+
+class _PinnedIPAdapter(HTTPAdapter):
+    """
+    将指定域名的请求固定到某个IP，效果等同于临时hosts，但不修改系统文件
+    """
+
+    def __init__(self, ip: str, domains: List[str], **kwargs):
+        self._pinned_ip = ip
+        self._pinned_domains = frozenset(domains)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault('ssl_context', _UNVERIFIED_SSL_CONTEXT)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _pinned_pool_class(HTTPConnectionPool, self._pinned_ip, self._pinned_domains),
+            'https': _pinned_pool_class(HTTPSConnectionPool, self._pinned_ip, self._pinned_domains),
+        }
+
+
+def _http_session() -> requests.Session:
+    """
+    创建下载tracker列表、官方IP段共用的会话，重复同步时复用TLS连接
+    """
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=4))
+    return session
+
+
+_HTTP = _http_session()
+
+
 class CFIPSelector(_PluginBase):
     plugin_name = "PT云盾优选"
     plugin_desc = "PT站点专属优选IP，自动写入hosts，访问快人一步"
     plugin_icon = "https://raw.githubusercontent.com/xijin285/MoviePilot-Plugins/refs/heads/main/icons/cfipselector.png"
-    plugin_version = "1.3.0"
+    plugin_version = "1.3.1"
     plugin_author = "xijin285"
     author_url = "https://github.com/xijin285"
     plugin_config_prefix = "cfipselector_"
@@ -43,11 +233,16 @@ class CFIPSelector(_PluginBase):
 
     # 私有属性
     _scheduler: Optional[BackgroundScheduler] = None
+    _scheduled_cron: Optional[str] = None  # 当前定时任务使用的cron表达式
+    _speed_pool: Optional[ThreadPoolExecutor] = None  # 完整测速线程池，跨轮次复用
+    _speed_pool_workers: int = 0
+    _max_parallel_domains: int = 4  # 完整测速线程池最多同时容纳的域名数
     _enabled: bool = False
     _cron: str = "0 3 * * *"
     _onlyonce: bool = False
     _notify: bool = False
     _datacenters: str = "SJC,YYZ"
+    _parsed_datacenters: List[str] = ["SJC", "YYZ"]  # 解析后的数据中心三字码
     _delay: int = 1500
     _ip_type: str = "4"
     _port: int = 443
@@ -60,14 +255,19 @@ class CFIPSelector(_PluginBase):
     _last_selected_ip = ''
     _concurrency: int = 20  # 并发线程数
     _cidr_sample_num: int = 100  # CIDR抽样数
-    _candidate_num: int = 20  # 第二阶段候选数量
+    _candidate_num: int = 20  # 参与完整测速的候选数量
+    _cf_check_factor: int = 5  # 参与Cloudflare节点判断的候选数为candidate_num的倍数
+    _early_stop_delay: int = 200  # 完整测速平均延迟低于该值(ms)即视为足够好，停止该域名剩余测速
 
     # 新增tracker优选相关私有属性
     _enable_site_select: bool = True  # PT站点优选开关
     _enable_tracker_select: bool = False  # tracker优选开关
     _tracker_include_list: List[str] = []  # UI tracker域名列表
     _github_tracker_url: str = None  # GitHub tracker列表URL
-    _auto_sync_scheduler: Optional[BackgroundScheduler] = None
+    # 站点数据缓存，init_plugin与每次优选开始时刷新
+    _active_sites_cache: list = []
+    _custom_sites_cache: List[dict] = []
+    _site_domain_cache: Dict[Any, str] = {}  # {站点id: 完整域名}，随站点缓存一起刷新
 
     # 爱快路由器 DNS 同步相关配置
     _enable_ikuai_dns: bool = False  # 是否启用爱快 DNS 同步
@@ -76,12 +276,51 @@ class CFIPSelector(_PluginBase):
     _ikuai_password: str = ""  # 爱快路由器密码
     _ikuai_dns_manager: Optional[IkuaiDNSManager] = None  # DNS 管理器实例
 
+    # 数据中心网段区间表（按IP版本分组，供二分查找）
+    _colo_index: Optional[Dict[int, Tuple[List[int], List[Tuple[int, int, int, str]], List[int]]]] = None
+    _colo_index_source: Optional[dict] = None
+    # 数据中心预解析网段（colo -> IP版本 -> ip_network列表）
+    _compiled_nets: Optional[Dict[str, Dict[int, list]]] = None
+    _compiled_nets_source: Optional[dict] = None
+    # 数据中心IP池缓存（(IP版本, 数据中心, 每网段采样数) -> IP列表），locations重新加载后清空
+    _ip_pool_cache: Dict[tuple, list] = {}  # IPv4为整数数组，IPv6为字符串列表
+    _ip_pool_cache_source: Optional[dict] = None
+
+    # 数据文件缓存：locations.json按修改时间失效，Cloudflare官方IP段按TTL失效
+    _locations_cache: Optional[dict] = None
+    _locations_mtime: int = 0
+    _cf_ip_list_cache: Dict[int, Tuple[Optional[int], float, List[str]]] = {}
+    _cf_ip_list_ttl: int = 24 * 3600
+    # 网络连通性检测结果缓存：(过期时间, 是否连通)
+    _net_cache: Tuple[float, bool] = (0.0, False)
+    _net_cache_ttl: int = 30
+    _net_lock = threading.Lock()
+    # 配置页静态布局缓存及站点选择组件在布局中的下标路径
+    _form_layout_cache: Optional[List[dict]] = None
+    _form_sign_sites_path: Optional[List[int]] = None
+    # 状态页站点芯片颜色缓存：{站点名: 颜色}
+    _chip_color_cache: Dict[str, str] = {}
+    # hosts中是否存在优选条目的检测结果缓存：(mtime_ns, 是否存在)
+    _hosts_cache: Optional[Tuple[int, bool]] = None
+    # trackers_include.txt解析结果缓存：(mtime_ns, 域名集合)
+    _tracker_cache: Optional[Tuple[int, frozenset]] = None
+
+    # 上次成功写入的优选结果签名，结果未变化时跳过hosts/DNS写入
+    _last_ip_map_sig: str = ""
+
+    # 后台初始化任务锁，避免trackers_include.txt被并发写入
+    _post_init_lock = threading.Lock()
+    # 后台tracker初始化同步完成标记，优选读取tracker列表前等待
+    _trackers_ready: Optional[threading.Event] = None
+
     def init_plugin(self, config: dict = None):
         #logger.info("PT云盾优选 插件已加载")
-        self.stop_service()  # 每次都先彻底停止服务
+        # 调度器在配置变更时复用，只调整发生变化的任务，不再每次停止重建
         self.sites = None
         self.siteoper = None
         self._sign_sites = []
+        self._cf_ip_list_cache = {}
+        self._ip_pool_cache = {}
         self._last_select_time = ''
         self._last_selected_ip = ''
         self._tracker_include_list = []  # 新增：UI tracker域名列表
@@ -92,12 +331,16 @@ class CFIPSelector(_PluginBase):
             self.siteoper = SiteOper()
         except Exception as e:
             logger.warning(f"未能加载站点数据源: {e}")
+        self._refresh_sites()
         if config:
             self._enabled = bool(config.get("enabled", False))
             self._cron = str(config.get("cron", "0 3 * * *"))
             self._onlyonce = bool(config.get("onlyonce", False))
             self._notify = bool(config.get("notify", False))
             self._datacenters = str(config.get("datacenters", "SJC,YYZ"))
+            # 去重并保持顺序，避免重复的三字码生成重复IP
+            self._parsed_datacenters = list(dict.fromkeys(
+                d.strip().upper() for d in self._datacenters.split(",") if d.strip()))
             self._delay = int(config.get("delay", 1500))
             self._ip_type = str(config.get("ip_type", "4"))
             self._port = int(config.get("port", 443))
@@ -110,54 +353,20 @@ class CFIPSelector(_PluginBase):
             self._sign_sites = [str(i) for i in raw_sign_sites]
             self._last_select_time = config.get("last_select_time", "")
             self._last_selected_ip = config.get("last_selected_ip", "")
-            all_ids = []
-            if self.siteoper:
-                try:
-                    all_ids += [str(site.id) for site in self.siteoper.list_active()]
-                except Exception:
-                    pass
-            try:
-                custom_sites_config = self.get_config("CustomSites")
-                if custom_sites_config and custom_sites_config.get("enabled"):
-                    custom_sites = custom_sites_config.get("sites")
-                    all_ids += [str(site.get("id")) for site in custom_sites]
-            except Exception:
-                pass
+            self._last_ip_map_sig = str(config.get("last_ip_map_sig", ""))
+            all_ids = {str(site.id) for site in self._active_sites_cache}
+            all_ids.update(str(site.get("id")) for site in self._custom_sites_cache)
             self._sign_sites = [i for i in self._sign_sites if i in all_ids]
 
-            # 初始化爱快路由器 DNS 同步配置
-            self._enable_ikuai_dns = bool(config.get("enable_ikuai_dns", False))
-            self._ikuai_url = str(config.get("ikuai_url", ""))
-            self._ikuai_username = str(config.get("ikuai_username", "admin"))
-            self._ikuai_password = str(config.get("ikuai_password", ""))
-            
-            # 初始化爱快 DNS 管理器
-            if self._enable_ikuai_dns and self._ikuai_url and self._ikuai_password:
-                self._ikuai_dns_manager = IkuaiDNSManager()
-                self._ikuai_dns_manager.init_config(
-                    url=self._ikuai_url,
-                    username=self._ikuai_username,
-                    password=self._ikuai_password
-                )
-            else:
-                self._ikuai_dns_manager = None
-
             # 新增：tracker优选域名UI配置
             tracker_include_list = config.get("tracker_include_list")
             if tracker_include_list is not None:
                 if isinstance(tracker_include_list, str):
                     tracker_include_list = [i.strip() for i in tracker_include_list.splitlines() if i.strip()]
-                self._tracker_include_list = tracker_include_list
-                # 保存到trackers_include.txt
-                try:
-                    include_path = '/config/plugins/CFIPSelector/trackers_include.txt'
-                    from pathlib import Path
-                    Path('/config/plugins/CFIPSelector').mkdir(parents=True, exist_ok=True)
-                    with open(include_path, 'w', encoding='utf-8') as f:
-                        for line in self._tracker_include_list:
-                            f.write(line + '\n')
-                except Exception as e:
-                    logger.warning(f"写入trackers_include.txt失败: {e}")
+                # 去重并保持原有顺序
+                self._tracker_include_list = list(dict.fromkeys(tracker_include_list))
+                # 同步保存到trackers_include.txt，确保随后的优选任务读取到最新列表
+                self._save_tracker_include_list()
             else:
                 self._tracker_include_list = []
             self._enable_site_select = bool(config.get("enable_site_select", True))
@@ -170,11 +379,12 @@ class CFIPSelector(_PluginBase):
             self._ikuai_username = str(config.get("ikuai_username", "admin")).strip()
             self._ikuai_password = str(config.get("ikuai_password", "")).strip()
 
-            # 如果爱快DNS同步功能启用且配置有效，则初始化DNS管理器
+            # 如果爱快DNS同步功能启用且配置有效，则获取DNS管理器（凭据不变时复用已有连接）
+            previous_manager = self._ikuai_dns_manager
+            self._ikuai_dns_manager = None
             if self._enable_ikuai_dns and self._ikuai_url and self._ikuai_password:
                 try:
-                    self._ikuai_dns_manager = IkuaiDNSManager()
-                    self._ikuai_dns_manager.init_config(
+                    self._ikuai_dns_manager = get_dns_manager(
                         url=self._ikuai_url,
                         username=self._ikuai_username,
                         password=self._ikuai_password
@@ -182,38 +392,69 @@ class CFIPSelector(_PluginBase):
                     logger.info("爱快DNS管理器初始化成功")
                 except Exception as e:
                     logger.error(f"爱快DNS管理器初始化失败: {str(e)}")
-                    self._ikuai_dns_manager = None
-            else:
-                self._ikuai_dns_manager = None
+            elif previous_manager:
+                # 关闭同步后释放连接池
+                previous_manager.close()
 
             self.__update_config()
+        # 定时优选、tracker自动同步、后台初始化共用一个调度器
+        if not self._scheduler or not self._scheduler.running:
+            self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+            self._scheduled_cron = None
         if self._enabled:
             if self._onlyonce:
                 try:
-                    if not self._scheduler or not self._scheduler.running:
-                        self._scheduler = BackgroundScheduler(timezone=settings.TZ)
                     job_name = f"{self.plugin_name}服务_onlyonce"
-                    if self._scheduler.get_job(job_name):
-                        self._scheduler.remove_job(job_name)
                     logger.info(f"{self.plugin_name} 服务启动，立即运行一次")
                     self._scheduler.add_job(func=self.select_ips, trigger='date',
-                        run_date=datetime.now(), name=job_name, id=job_name)
+                        run_date=datetime.now(), name=job_name, id=job_name, replace_existing=True)
                     self._onlyonce = False
                     self.__update_config()
-                    if self._scheduler and not self._scheduler.running:
-                        self._scheduler.start()
                 except Exception as e:
                     logger.error(f"启动一次性 {self.plugin_name} 任务失败: {str(e)}")
+                self.__remove_task()
             else:
                 self.__add_task()
         else:
             logger.info("插件未启用")
+            self.__remove_task()
             self._clear_hosts_cfipselector()
         # 新增：每小时自动同步内置tracker列表（仅在UI输入为空时）
         self.__add_auto_sync_trackers_task()
-        # 新增：插件初始化时自动同步GitHub tracker列表（仅在无自定义时）
-        if not self._tracker_include_list:
-            self.sync_trackers_from_github()
+        # 无自定义tracker时从GitHub同步放到后台执行，不阻塞插件加载
+        # 不指定固定id，避免调度器运行中替换即将执行的任务
+        self._trackers_ready = threading.Event()
+        if self._tracker_include_list:
+            self._trackers_ready.set()
+        else:
+            self._scheduler.add_job(self._post_init, trigger='date', args=[self._trackers_ready],
+                                    name='初始化tracker列表')
+        if not self._scheduler.running:
+            self._scheduler.start()
+
+    def _save_tracker_include_list(self):
+        """
+        将UI配置的tracker列表写入trackers_include.txt
+        """
+        with self._post_init_lock:
+            try:
+                include_path = '/config/plugins/CFIPSelector/trackers_include.txt'
+                Path('/config/plugins/CFIPSelector').mkdir(parents=True, exist_ok=True)
+                Path(include_path).write_text(''.join(f"{line}\n" for line in self._tracker_include_list),
+                                              encoding='utf-8')
+            except Exception as e:
+                logger.warning(f"写入trackers_include.txt失败: {e}")
+
+    def _post_init(self, ready: threading.Event):
+        """
+        插件加载后的后台初始化：无自定义tracker时从GitHub同步，完成后置位ready
+        """
+        try:
+            with self._post_init_lock:
+                if not self._tracker_include_list:
+                    self.sync_trackers_from_github()
+        finally:
+            ready.set()
 
     def __update_config(self):
         self.update_config({
@@ -238,6 +479,7 @@ class CFIPSelector(_PluginBase):
             "sign_sites": self._sign_sites or [],
             "last_select_time": getattr(self, '_last_select_time', ''),
             "last_selected_ip": getattr(self, '_last_selected_ip', ''),
+            "last_ip_map_sig": self._last_ip_map_sig,
             "enable_site_select": self._enable_site_select,
             "enable_tracker_select": self._enable_tracker_select,
             "tracker_include_list": "\n".join(self._tracker_include_list) if self._tracker_include_list else "",
@@ -245,29 +487,36 @@ class CFIPSelector(_PluginBase):
         })
 
     def __add_task(self):
-        if self._scheduler and self._scheduler.running:
-            self._scheduler.shutdown()
-        self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+        job_id = f"{self.plugin_name}定时服务"
+        # cron未变化时保留现有任务，避免无变更保存时重置调度
+        if self._scheduled_cron == self._cron and self._scheduler.get_job(job_id):
+            return
         try:
             trigger = CronTrigger.from_crontab(self._cron, timezone=settings.TZ)
-            self._scheduler.add_job(self.select_ips, trigger=trigger, name=f"{self.plugin_name}定时服务", id=f"{self.plugin_name}定时服务")
-            self._scheduler.start()
+            if self._scheduler.get_job(job_id):
+                self._scheduler.reschedule_job(job_id, trigger=trigger)
+            else:
+                self._scheduler.add_job(self.select_ips, trigger=trigger, name=job_id, id=job_id)
+            self._scheduled_cron = self._cron
             logger.info(f"{self.plugin_name} 定时任务已启动: {self._cron}")
         except Exception as e:
             logger.error(f"{self.plugin_name} cron表达式格式错误: {self._cron}, 错误: {e}")
 
+    def __remove_task(self):
+        job_id = f"{self.plugin_name}定时服务"
+        if self._scheduler.get_job(job_id):
+            self._scheduler.remove_job(job_id)
+        self._scheduled_cron = None
+
     def __add_auto_sync_trackers_task(self):
         """
         启动一个定时任务，每天自动同步内置tracker列表（仅在插件启用且UI输入为空时）
         """
-        if hasattr(self, '_auto_sync_scheduler') and self._auto_sync_scheduler and self._auto_sync_scheduler.running:
+        if self._scheduler.get_job('auto_sync_trackers'):
             return
-        from apscheduler.schedulers.background import BackgroundScheduler
-        from apscheduler.triggers.interval import IntervalTrigger
-        self._auto_sync_scheduler = BackgroundScheduler(timezone=settings.TZ)
         trigger = IntervalTrigger(days=1)  # 改为每天同步一次
-        self._auto_sync_scheduler.add_job(self._auto_sync_trackers, trigger=trigger, name='自动同步GitHub tracker列表')
-        self._auto_sync_scheduler.start()
+        self._scheduler.add_job(self._auto_sync_trackers, trigger=trigger, name='自动同步GitHub tracker列表',
+                                id='auto_sync_trackers', replace_existing=True)
 
     def _auto_sync_trackers(self):
         # 只有插件启用且UI输入为空才自动同步
@@ -281,23 +530,32 @@ class CFIPSelector(_PluginBase):
     def _download_cf_ip_list(self, ip_type: int = 4) -> list:
         """
         优先读取resources/cfv4.txt/cfv6.txt，若不存在则自动下载Cloudflare官方IP段
+        结果缓存在内存中：本地文件按修改时间失效，官方下载结果按TTL失效
         """
+        cached = self._cf_ip_list_cache.get(ip_type)
         local_file = os.path.join(os.path.dirname(__file__), 'resources', f"cfv{ip_type}.txt")
         if os.path.exists(local_file):
             try:
+                mtime = os.stat(local_file).st_mtime_ns
+                if cached and cached[0] == mtime:
+                    return cached[2]
                 with open(local_file, 'r', encoding='utf-8') as f:
-                    lines = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+                    lines = [text for line in f if (text := line.strip()) and text[0] != '#']
                 logger.info(f"读取本地resources/cfv{ip_type}.txt成功，共{len(lines)}条")
+                self._cf_ip_list_cache[ip_type] = (mtime, float('inf'), lines)
                 return lines
             except Exception as e:
                 logger.error(f"读取本地resources/cfv{ip_type}.txt失败: {e}")
+        elif cached and cached[0] is None and time.monotonic() < cached[1]:
+            return cached[2]
         # 本地不存在则拉取官方
         url = "https://www.cloudflare.com/ips-v4" if ip_type == 4 else "https://www.cloudflare.com/ips-v6"
         try:
-            resp = requests.get(url, timeout=10)
+            resp = _HTTP.get(url, timeout=10)
             if resp.status_code == 200:
-                lines = [line.strip() for line in resp.text.splitlines() if line.strip() and not line.startswith('#')]
+                lines = [text for line in resp.text.splitlines() if (text := line.strip()) and text[0] != '#']
                 logger.info(f"获取Cloudflare官方IPv{ip_type}网段成功，共{len(lines)}条")
+                self._cf_ip_list_cache[ip_type] = (None, time.monotonic() + self._cf_ip_list_ttl, lines)
                 return lines
             else:
                 logger.error(f"获取Cloudflare官方IPv{ip_type}网段失败，状态码: {resp.status_code}")
@@ -305,160 +563,571 @@ class CFIPSelector(_PluginBase):
             logger.error(f"下载Cloudflare官方IPv{ip_type}网段异常: {e}")
         return []
 
+    @staticmethod
+    def _sample_net(net_obj, n: int) -> List[str]:
+        """
+        取网段内前n个主机地址（与hosts()结果一致）的字符串形式
+        """
+        to_str = _int_to_v4 if net_obj.version == 4 else (lambda i: str(ipaddress.IPv6Address(i)))
+        return [to_str(i) for i in CFIPSelector._sample_net_ints(net_obj, n)]
+
+    @staticmethod
+    def _sample_net_ints(net_obj, n: int):
+        """
+        取网段内前n个主机地址（与hosts()结果一致）的整数形式，用整数区间直接计算，不逐个迭代生成器
+        """
+        if net_obj.num_addresses <= 2:
+            return [int(ip) for ip in itertools.islice(net_obj.hosts(), n)]
+        start = int(net_obj.network_address) + 1
+        # IPv4的hosts()不含广播地址，IPv6只排除网络地址
+        stop = int(net_obj.broadcast_address) + (1 if net_obj.version == 6 else 0)
+        return range(start, min(start + n, stop))
+
+    @staticmethod
+    def _memory_percent() -> Optional[float]:
+        """
+        读取当前内存使用率，无法获取时返回None
+        """
+        try:
+            return psutil.virtual_memory().percent
+        except Exception:
+            return None
+
     def _get_ip_pool(self, ip_type: int = 4, max_per_net: int = 10) -> list:
         """
         获取IP池：自动下载官方IP段并解析，返回部分真实IP
         """
         nets = self._download_cf_ip_list(ip_type)
         ip_pool = []
-        for net in nets:
+        memory_percent = None
+        for idx, net in enumerate(nets):
             try:
                 net_obj = ipaddress.ip_network(net, strict=False)
                 
-                # 检查内存使用情况（仅对IPv6）
+                # 检查内存使用情况（仅对IPv6），每32个网段读取一次
                 if ip_type == 6 and PSUTIL_AVAILABLE:
-                    try:
-                        memory_percent = psutil.virtual_memory().percent
-                        if memory_percent > 80:
-                            logger.warning(f"内存使用率过高（{memory_percent:.1f}%），跳过IPv6网段 {net}")
-                            continue
-                    except Exception:
-                        pass  # 如果无法获取内存信息，继续执行
+                    if idx & 31 == 0:
+                        memory_percent = self._memory_percent()
+                    if memory_percent is not None and memory_percent > 80:
+                        logger.warning(f"内存使用率过高（{memory_percent:.1f}%），跳过IPv6网段 {net}")
+                        continue
                 
                 # 只取每个网段前max_per_net个IP，避免爆炸
-                # 对于IPv6，设置更小的采样限制
-                if ip_type == 6:
-                    max_per_net_v6 = min(max_per_net, 5)  # IPv6最多采样5个
-                    for idx, ip in enumerate(net_obj.hosts()):
-                        if idx >= max_per_net_v6:
-                            break
-                        ip_pool.append(str(ip))
-                else:
-                    for idx, ip in enumerate(net_obj.hosts()):
-                        if idx >= max_per_net:
-                            break
-                        ip_pool.append(str(ip))
+                # 对于IPv6，设置更小的采样限制（最多5个）
+                ip_pool.extend(self._sample_net(net_obj, min(max_per_net, 5) if ip_type == 6 else max_per_net))
             except Exception as e:
                 logger.warning(f"解析网段{net}失败: {e}")
         logger.info(f"生成IPv{ip_type} IP池，共{len(ip_pool)}个IP")
         return ip_pool
 
-    def _get_ip_pool_by_datacenters(self, ip_type: int, datacenters: List[str], max_per_net: int = 10) -> list:
+    def _get_ip_pool_by_datacenters(self, ip_type: int, datacenters: List[str], max_per_net: int = 10,
+                                    sample_k: Optional[int] = None, exclude: Optional[set] = None) -> list:
         """
         只生成目标数据中心的IP池，优化为所有网段均匀采样
+        exclude: 需排除的IP（如已尝试过的IP）
+        sample_k: 指定时直接随机抽取至多sample_k个IP返回，不再打乱整个IP池
         """
-        import random
-        loc_path = os.path.join(os.path.dirname(__file__), 'resources', 'locations.json')
-        if os.path.exists(loc_path):
-            with open(loc_path, 'r', encoding='utf-8') as f:
-                locations = json.load(f)
-        else:
-            logger.warning("未找到本地 resources/locations.json，请在resources目录下自行维护数据中心映射表！")
+        locations = self._locations()
+        if not locations:
             return []
+        if self._ip_pool_cache_source is not locations:
+            self._ip_pool_cache = {}
+            self._ip_pool_cache_source = locations
+        cache_key = (ip_type, tuple(datacenters), max_per_net)
+        ip_pool = self._ip_pool_cache.get(cache_key)
+        if ip_pool is None:
+            ip_pool, complete = self._build_datacenter_pool(locations, ip_type, datacenters, max_per_net)
+            logger.info(f"生成IPv{ip_type} IP池（均匀采样），共{len(ip_pool)}个IP")
+            # 因内存不足跳过了网段的IP池不缓存，下次重新生成
+            if complete:
+                self._ip_pool_cache[cache_key] = ip_pool
+        if sample_k is not None:
+            return self._sample_excluding(ip_pool, sample_k, exclude or ())
+        if exclude:
+            ip_pool = [ip for ip in ip_pool if ip not in exclude]
+        else:
+            ip_pool = list(ip_pool)
+        random.shuffle(ip_pool)
+        return self._pool_to_str(ip_pool) if ip_type == 4 else ip_pool
+
+    @staticmethod
+    def _pool_to_str(values) -> List[str]:
+        """
+        IPv4整数转为点分字符串，仅在IP交给探测/测速前调用
+        """
+        return [_int_to_v4(v) for v in values]
+
+    @staticmethod
+    def _sample_excluding(pool, k: int, exclude) -> List[str]:
+        """
+        从pool中随机抽取至多k个不在exclude中的IP
+        可用IP充足时直接随机取下标并跳过已排除的IP，不必先过滤整个IP池，
+        抽取次数超过上限仍未取满时退回过滤后整体抽样
+        pool为IPv4整数数组时按整数判断排除，只把抽中的IP转为字符串
+        """
+        n = len(pool)
+        picked = None
+        if n - len(exclude) >= 2 * k:
+            picked = []
+            seen = set()
+            for _ in range(4 * k):
+                idx = random.randrange(n)
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                ip = pool[idx]
+                if ip not in exclude:
+                    picked.append(ip)
+                    if len(picked) >= k:
+                        break
+            if len(picked) < k:
+                picked = None
+        if picked is None:
+            remaining = [ip for ip in dict.fromkeys(pool) if ip not in exclude]
+            picked = random.sample(remaining, min(k, len(remaining)))
+        return CFIPSelector._pool_to_str(picked) if isinstance(pool, array) else picked
+
+    def _build_datacenter_pool(self, locations: dict, ip_type: int, datacenters: List[str],
+                               max_per_net: int) -> Tuple[list, bool]:
+        """
+        按数据中心网段采样生成IP池，返回(IP池, 是否所有网段都已采样)
+        IPv4存为无符号32位整数数组（每个IP 4字节），IPv6仍为字符串列表
+        """
+        compiled_nets = self._compiled_colo_nets(locations)
         nets = []
         for dc in datacenters:
-            info = locations.get(dc)
-            if info:
-                nets += [net for net in info.get('nets', []) if (':' in net if ip_type==6 else ':' not in net)]
-        ip_pool = []
-        for net in nets:
+            if dc in compiled_nets:
+                nets += compiled_nets[dc][ip_type]
+        # 不同数据中心可能共用网段，去重避免IP池中出现重复IP
+        nets = list(dict.fromkeys(nets))
+        ip_pool = array('I') if ip_type == 4 else []
+        complete = True
+        memory_percent = None
+        for idx, net_obj in enumerate(nets):
             try:
-                net_obj = ipaddress.ip_network(net, strict=False)
-                
-                # 检查内存使用情况（仅对IPv6）
+                # 检查内存使用情况（仅对IPv6），每32个网段读取一次
                 if ip_type == 6 and PSUTIL_AVAILABLE:
-                    try:
-                        memory_percent = psutil.virtual_memory().percent
-                        if memory_percent > 80:
-                            logger.warning(f"内存使用率过高（{memory_percent:.1f}%），跳过IPv6网段 {net}")
-                            continue
-                    except Exception:
-                        pass  # 如果无法获取内存信息，继续执行
+                    if idx & 31 == 0:
+                        memory_percent = self._memory_percent()
+                    if memory_percent is not None and memory_percent > 80:
+                        logger.warning(f"内存使用率过高（{memory_percent:.1f}%），跳过IPv6网段 {net_obj}")
+                        complete = False
+                        continue
                 
-                # 修复IPv6内存爆炸问题：不使用list()，直接使用迭代器
-                # 对于IPv6，设置更小的采样限制
-                if ip_type == 6:
-                    # IPv6网段可能非常大，限制采样数量
-                    max_per_net_v6 = min(max_per_net, 5)  # IPv6最多采样5个
-                    sampled_ips = []
-                    for idx, ip in enumerate(net_obj.hosts()):
-                        if idx >= max_per_net_v6:
-                            break
-                        sampled_ips.append(str(ip))
-                    ip_pool.extend(sampled_ips)
+                if ip_type == 4:
+                    ip_pool.extend(self._sample_net_ints(net_obj, max_per_net))
                 else:
-                    # IPv4使用原来的逻辑
-                    sampled_ips = []
-                    for idx, ip in enumerate(net_obj.hosts()):
-                        if idx >= max_per_net:
-                            break
-                        sampled_ips.append(str(ip))
-                    ip_pool.extend(sampled_ips)
+                    # IPv6网段可能非常大，限制采样数量（最多5个）
+                    ip_pool.extend(self._sample_net(net_obj, min(max_per_net, 5)))
             except Exception as e:
-                logger.warning(f"解析网段{net}失败: {e}")
-        random.shuffle(ip_pool)
-        logger.info(f"生成IPv{ip_type} IP池（均匀采样），共{len(ip_pool)}个IP")
-        return ip_pool
+                logger.warning(f"采样网段{net_obj}失败: {e}")
+        # 网段之间可能重叠，按首次出现顺序去除重复IP
+        if len(set(ip_pool)) != len(ip_pool):
+            unique = dict.fromkeys(ip_pool)
+            ip_pool = array('I', unique) if ip_type == 4 else list(unique)
+        return ip_pool, complete
 
-    def _download_locations_json(self):
+    def _locations(self) -> dict:
         """
-        优先读取本地resources/locations.json，找不到时再查找绝对路径兜底
+        读取本地resources/locations.json，解析结果按文件修改时间缓存
         """
         loc_path = os.path.join(os.path.dirname(__file__), 'resources', 'locations.json')
-        if os.path.exists(loc_path):
+        try:
+            mtime = os.stat(loc_path).st_mtime_ns
+        except OSError:
+            logger.warning("未找到本地 resources/locations.json，请在resources目录下自行维护数据中心映射表！")
+            return {}
+        if self._locations_cache is None or mtime != self._locations_mtime:
             with open(loc_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        logger.warning("未找到本地 resources/locations.json，请在resources目录下自行维护数据中心映射表！")
-        return {}
+                self._locations_cache = json.load(f)
+            self._locations_mtime = mtime
+        return self._locations_cache
+
+    def _compiled_colo_nets(self, locations: dict) -> Dict[str, Dict[int, list]]:
+        """
+        将各数据中心的网段预解析为ip_network对象并按IP版本分组，locations重新加载后才重建
+        """
+        if self._compiled_nets is None or self._compiled_nets_source is not locations:
+            compiled = {}
+            for colo, info in locations.items():
+                by_version = {4: [], 6: []}
+                for net in info.get('nets', []):
+                    try:
+                        net_obj = ipaddress.ip_network(net, strict=False)
+                    except ValueError as e:
+                        logger.warning(f"解析网段{net}失败: {e}")
+                        continue
+                    by_version[net_obj.version].append(net_obj)
+                compiled[colo] = by_version
+            self._compiled_nets = compiled
+            self._compiled_nets_source = locations
+        return self._compiled_nets
 
-    def _ip_to_datacenter(self, ip, locations):
+    def _download_locations_json(self):
         """
-        根据locations.json映射IP到数据中心三字码
+        优先读取本地resources/locations.json，找不到时再查找绝对路径兜底
         """
-        for colo, info in locations.items():
+        return self._locations()
+
+    @staticmethod
+    def _build_colo_index(locations: dict) -> Dict[int, Tuple[List[int], List[Tuple[int, int, int, str]], List[int]]]:
+        """
+        将locations.json中的网段预处理为按起始地址排序的区间表
+        返回{IP版本: (起始地址列表, (起始, 结束, 数据中心序号, 三字码)列表, 结束地址前缀最大值列表)}
+        """
+        spans = {4: {}, 6: {}}
+        for order, (colo, info) in enumerate(locations.items()):
             for net in info.get('nets', []):
                 try:
-                    if ipaddress.ip_address(ip) in ipaddress.ip_network(net, strict=False):
-                        return colo
-                except Exception:
+                    net_obj = ipaddress.ip_network(net, strict=False)
+                except ValueError:
                     continue
-        return '?'
+                # 同一网段出现在多个数据中心时，保留最先出现的
+                spans[net_obj.version].setdefault(
+                    (int(net_obj.network_address), int(net_obj.broadcast_address)), (order, colo))
+        index = {}
+        for version, version_spans in spans.items():
+            intervals = sorted((start, end, order, colo) for (start, end), (order, colo) in version_spans.items())
+            starts = [interval[0] for interval in intervals]
+            max_ends = list(itertools.accumulate((interval[1] for interval in intervals), max))
+            index[version] = (starts, intervals, max_ends)
+        return index
 
-    def _tcp_ping(self, ip, port=443, timeout=1):
+    def _ip_to_datacenter(self, ip, locations=None):
         """
-        用socket connect检测IP延迟，失败返回9999
+        根据locations.json映射IP到数据中心三字码，区间表二分查找
         """
-        import socket
+        if locations is None:
+            locations = self._locations()
+        if self._colo_index is None or self._colo_index_source is not locations:
+            self._colo_index = self._build_colo_index(locations)
+            self._colo_index_source = locations
         try:
-            family = socket.AF_INET6 if ':' in ip else socket.AF_INET
-            s = socket.socket(family, socket.SOCK_STREAM)
-            s.settimeout(timeout)
-            start = time.time()
-            s.connect((ip, port))
-            delay = (time.time() - start) * 1000
-            s.close()
-            return delay
-        except Exception:
+            # IPv4走inet_pton快速路径，IPv6才构造ipaddress对象
+            if ':' not in ip:
+                version, ip_int = 4, _v4_to_int(ip)
+            else:
+                version, ip_int = 6, int(ipaddress.IPv6Address(ip))
+        except (OSError, ValueError):
+            return '?'
+        starts, intervals, max_ends = self._colo_index[version]
+        idx = bisect.bisect_right(starts, ip_int) - 1
+        # 网段可能相互嵌套，向前回溯所有仍可能覆盖该IP的区间，按locations中的顺序取第一个
+        best = None
+        while idx >= 0 and max_ends[idx] >= ip_int:
+            _, end, order, colo = intervals[idx]
+            if end >= ip_int and (best is None or order < best[0]):
+                best = (order, colo)
+            idx -= 1
+        return best[1] if best else '?'
+
+    @staticmethod
+    def _run_async(coro):
+        """
+        在独立的事件循环中运行协程，uvloop可用时优先使用
+        不修改全局事件循环策略，避免影响主程序
+        """
+        loop = uvloop.new_event_loop() if UVLOOP_AVAILABLE else asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    @staticmethod
+    async def _tcp_ping_async(ip: str, port: int = 443) -> float:
+        """
+        异步socket connect检测IP延迟，失败返回9999；超时由调用方取消任务控制
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            s = _probe_socket(ip)
+        except OSError:
             return 9999
+        try:
+            start = time.perf_counter_ns()
+            await loop.sock_connect(s, (ip, port))
+            return (time.perf_counter_ns() - start) / 1e6
+        except OSError:
+            return 9999
+        finally:
+            s.close()
+
+    async def _tcp_ping_gather(self, ips: List[str], port: int, timeout: float) -> Dict[str, float]:
+        """
+        分批TCP ping：同一批连接同时发起、共用一个截止时间，到期未完成的连接统一取消并记为9999
+        """
+        batch_size = max(1, self._concurrency * 20)
+        delays = {}
+        for offset in range(0, len(ips), batch_size):
+            tasks = {asyncio.ensure_future(self._tcp_ping_async(ip, port)): ip
+                     for ip in ips[offset:offset + batch_size]}
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            for task, ip in tasks.items():
+                delays[ip] = task.result() if task in done and not task.exception() else 9999
+        return delays
 
-    def _is_cf_node(self, ip: str, port: int = 443, tls: bool = True, timeout: int = 2) -> bool:
+    def _tcp_ping_batch(self, ips: List[str], port: int = 443, timeout: float = 1) -> Dict[str, float]:
+        """
+        在单线程事件循环中并发TCP ping一批IP，返回{ip: 延迟ms}，失败为9999
+        """
+        if not ips:
+            return {}
+        return self._run_async(self._tcp_ping_gather(ips, port, timeout))
+
+    async def _is_cf_node_async(self, ip: str, port: int = 443, tls: bool = True, timeout: float = 2,
+                                ssl_context: Optional[ssl.SSLContext] = None) -> bool:
         """
         检查该IP是否为Cloudflare反代节点（通过访问 /cdn-cgi/trace 判断）
+        只读取响应前4KB，在响应头中查找cloudflare特征
+        """
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, port, ssl=ssl_context if tls else None), timeout)
+            return await self._check_cf_trace(ip, reader, writer, timeout)
+        except Exception:
+            return False
+        finally:
+            if writer:
+                writer.close()
+
+    @staticmethod
+    async def _check_cf_trace(ip: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              timeout: float) -> bool:
+        """
+        在已建立的连接上请求 /cdn-cgi/trace，读取响应前4KB判断是否为Cloudflare节点
+        """
+        host = f"[{ip}]" if ':' in ip else ip
+        writer.write(f"GET /cdn-cgi/trace HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        head = b''
+        while len(head) < 4096:
+            chunk = await asyncio.wait_for(reader.read(4096 - len(head)), timeout)
+            if not chunk:
+                break
+            head += chunk
+        # 与原先按文本小写匹配一致，头部大小写不同（如Server: Cloudflare）也能识别
+        head = head.lower()
+        if b'cloudflare' in head or b'cf-ray' in head:
+            logger.info(f"IP {ip} 是Cloudflare反代节点")
+            return True
+        logger.info(f"IP {ip} 不是Cloudflare反代节点")
+        return False
+
+    async def _is_cf_node_gather(self, ips: List[str], port: int, tls: bool,
+                                 on_cf_node: Optional[Callable[[str], None]] = None) -> List[str]:
+        sem = asyncio.Semaphore(max(1, self._concurrency * 10))
+
+        async def _guarded(ip):
+            async with sem:
+                is_cf = await self._is_cf_node_async(ip, port, tls, ssl_context=_UNVERIFIED_SSL_CONTEXT)
+            if is_cf and on_cf_node:
+                on_cf_node(ip)
+            return is_cf
+
+        results = await asyncio.gather(*(_guarded(ip) for ip in ips), return_exceptions=True)
+        return [ip for ip, is_cf in zip(ips, results) if is_cf is True]
+
+    def _is_cf_node_batch(self, ips: List[str], port: int = 443, tls: bool = True,
+                          on_cf_node: Optional[Callable[[str], None]] = None) -> List[str]:
+        """
+        并发判断一批IP是否为Cloudflare反代节点，按输入顺序返回其中的Cloudflare节点
+        on_cf_node: 每确认一个Cloudflare节点立即回调（在事件循环线程中调用）
         """
+        if not ips:
+            return []
+        return self._run_async(self._is_cf_node_gather(ips, port, tls, on_cf_node))
+
+    async def _ping_and_check_cf_async(self, ip: str, port: int = 443, tls: bool = True, ping_timeout: float = 1,
+                                       timeout: float = 2) -> Tuple[float, bool]:
+        """
+        在同一条连接上完成TCP ping和Cloudflare节点判断，返回(延迟ms, 是否Cloudflare节点)
+        延迟只统计TCP建连耗时；ping失败或超过延迟阈值时不再发起HTTP请求
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            s = _probe_socket(ip)
+        except OSError:
+            return 9999, False
         try:
-            protocol = "https" if tls else "http"
-            url = f"{protocol}://{ip}:{port}/cdn-cgi/trace"
-            resp = requests.get(url, timeout=timeout, verify=False)
-            # 关键字判断
-            if "cloudflare" in resp.text.lower() or "cf-ray" in resp.text.lower():
-                logger.info(f"IP {ip} 是Cloudflare反代节点")
-                return True
+            start = time.perf_counter()
+            await asyncio.wait_for(loop.sock_connect(s, (ip, port)), ping_timeout)
+            delay = (time.perf_counter() - start) * 1000
+        except Exception:
+            s.close()
+            return 9999, False
+        if delay >= self._delay:
+            s.close()
+            return delay, False
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(sock=s, ssl=_UNVERIFIED_SSL_CONTEXT if tls else None,
+                                        server_hostname=ip if tls else None), timeout)
+            return delay, await self._check_cf_trace(ip, reader, writer, timeout)
+        except Exception:
+            return delay, False
+        finally:
+            if writer:
+                writer.close()
             else:
-                logger.info(f"IP {ip} 不是Cloudflare反代节点")
+                s.close()
+
+    async def _ping_and_check_cf_gather(self, ips: List[str], port: int, tls: bool,
+                                        on_cf_node: Optional[Callable[[str], None]] = None) -> Tuple[Dict[str, float], set]:
+        sem = asyncio.Semaphore(max(1, self._concurrency * 10))
+
+        async def _guarded(ip):
+            async with sem:
+                delay, is_cf = await self._ping_and_check_cf_async(ip, port, tls)
+            if is_cf and on_cf_node:
+                on_cf_node(ip)
+            return delay, is_cf
+
+        results = await asyncio.gather(*(_guarded(ip) for ip in ips), return_exceptions=True)
+        ping_results = {}
+        cf_set = set()
+        for ip, result in zip(ips, results):
+            delay, is_cf = result if isinstance(result, tuple) else (9999, False)
+            ping_results[ip] = delay
+            if is_cf:
+                cf_set.add(ip)
+        return ping_results, cf_set
+
+    def _screen_candidates(self, ip_pool: List[str],
+                           on_cf_node: Optional[Callable[[str], None]] = None) -> Tuple[List[str], List[str]]:
+        """
+        ping筛选并判断Cloudflare节点，返回(ping候选IP, 其中的Cloudflare节点)，均按延迟升序
+        IP池不超过Cloudflare判断候选数时，ping与节点判断复用同一条连接
+        on_cf_node: 每确认一个Cloudflare节点立即回调，用于提前开始后续测速
+        """
+        limit = self._candidate_num * self._cf_check_factor
+        if len(ip_pool) <= limit:
+            ping_results, cf_set = self._run_async(
+                self._ping_and_check_cf_gather(ip_pool, self._port, self._tls, on_cf_node))
+            candidate_ips = self._rank_ping_results(ping_results, limit)
+            return candidate_ips, [ip for ip in candidate_ips if ip in cf_set]
+        ping_results = self._tcp_ping_batch(ip_pool, self._port, 1)
+        candidate_ips = self._rank_ping_results(ping_results, limit)
+        return candidate_ips, self._is_cf_node_batch(candidate_ips, self._port, self._tls, on_cf_node)
+
+    def _pipeline_select(self, ip_pool: List[str], targets: Dict[str, bool], round_idx: int,
+                         executor: ThreadPoolExecutor, fallback_non_cf: bool = False) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """
+        对一轮IP池执行一次 ping筛选 → Cloudflare节点判断，再对所有待优选域名完整测速
+        每确认一个Cloudflare节点立即为各域名提交完整测速，不等待整批节点判断结束
+        targets: {域名: 是否宽松模式}，tracker使用宽松模式（能连上即成功）
+        fallback_non_cf: 没有Cloudflare节点时，直接对ping候选IP测速（IPv6使用，仅限非宽松模式的站点）
+        返回{域名: (最佳IP, 测速结果)}，未找到可用IP的域名不在结果中
+        """
+        best: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        future_to_key = {}
+        submitted_ips = set()
+        # 各域名找到足够好的IP后置位，用于跳过/中止该域名剩余的测速
+        stop_events = {domain: threading.Event() for domain in targets}
+
+        def _submit(ip, domains=targets):
+            # 确认过程中最多提前提交candidate_num个IP，筛选结束后再按延迟校正
+            if ip in submitted_ips or len(submitted_ips) >= self._candidate_num:
+                return
+            submitted_ips.add(ip)
+            for domain in domains:
+                if stop_events[domain].is_set():
+                    continue
+                future = executor.submit(self._test_ip_with_sites, ip, [domain], 5, targets[domain], 3,
+                                         stop_events[domain])
+                future_to_key[future] = (ip, domain)
+
+        candidate_ips, cf_ips = self._screen_candidates(ip_pool, on_cf_node=_submit)
+        if not candidate_ips:
+            logger.warning(f"第{round_idx}轮ping筛选后无可用IP！")
+            return best
+        if cf_ips:
+            # 只对延迟最低的candidate_num个Cloudflare节点做完整测速：
+            # 撤下提前提交但不在其中的IP（已开始的测速结果不再采用），补交尚未提交的IP
+            top_ips = cf_ips[:self._candidate_num]
+            top_set = set(top_ips)
+            for future, (ip, _) in list(future_to_key.items()):
+                if ip not in top_set:
+                    future.cancel()
+                    del future_to_key[future]
+            submitted_ips.intersection_update(top_set)
+            for ip in top_ips:
+                _submit(ip)
+        else:
+            logger.warning(f"第{round_idx}轮Cloudflare节点筛选后无可用IP！")
+            strict_domains = [domain for domain, loose_mode in targets.items() if not loose_mode]
+            if not fallback_non_cf or not strict_domains:
+                return best
+            logger.info(f"IPv6模式：跳过Cloudflare节点检测，直接使用ping筛选的候选IP进行测速")
+            for ip in candidate_ips:
+                _submit(ip, strict_domains)
+        total = len(future_to_key)
+        logger.info(f"第{round_idx}轮：并发完整测速（候选IP{len(submitted_ips)}个，域名{len(targets)}个）")
+        logger.info(f"开始做{total}项完整测速，请稍候...")
+        for idx, future in enumerate(as_completed(future_to_key), 1):
+            ip, domain = future_to_key[future]
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception:
+                result = {"success_count": 0, "avg_delay": 9999}
+            if idx % 20 == 0 or idx == total:
+                logger.info(f"完整测速进度：{idx}/{total}")
+            if result["success_count"] > 0:
+                if domain not in best or result["avg_delay"] < best[domain][1]["avg_delay"]:
+                    best[domain] = (ip, result)
+                if best[domain][1]["avg_delay"] < self._early_stop_delay and not stop_events[domain].is_set():
+                    logger.info(f"{domain} 已找到延迟{best[domain][1]['avg_delay']:.0f}ms的IP，停止其余测速")
+                    stop_events[domain].set()
+                    for other, (_, other_domain) in future_to_key.items():
+                        if other_domain == domain:
+                            other.cancel()
+        return best
+
+    def _get_speed_pool(self) -> ThreadPoolExecutor:
+        """
+        获取完整测速线程池，按最多同时容纳_max_parallel_domains个域名确定大小，线程按需创建
+        并发配置调大时只扩容：新建更大的线程池替换引用，旧线程池不关闭，
+        仍在使用它的其他优选任务可继续提交，空闲后随对象回收退出
+        """
+        max_workers = max(2, self._concurrency // 4) * self._max_parallel_domains
+        if self._speed_pool is None or self._speed_pool_workers < max_workers:
+            self._speed_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cfipselector-speed")
+            self._speed_pool_workers = max_workers
+        return self._speed_pool
+
+    def _rank_ping_results(self, ping_results: Dict[str, float], limit: int) -> List[str]:
+        """
+        从ping结果中筛出低于延迟阈值的IP，按延迟升序返回前limit个
+        用堆只保留前limit个，失败（9999）和超阈值的IP不参与比较
+        """
+        passed = ((ip, delay) for ip, delay in ping_results.items() if delay < self._delay)
+        return [ip for ip, _ in heapq.nsmallest(limit, passed, key=lambda item: item[1])]
+
+    def _refresh_sites(self):
+        """
+        刷新站点缓存：读取一次active站点和自定义站点，供后续站点筛选复用
+        """
+        # 站点配置可能已修改，域名解析结果随站点列表一起失效
+        self._site_domain_cache = {}
+        self._active_sites_cache = []
+        self._custom_sites_cache = []
+        if self.siteoper:
+            try:
+                self._active_sites_cache = list(self.siteoper.list_active())
+            except Exception as e:
+                logger.warning(f"获取站点列表失败: {e}")
+        try:
+            custom_sites_config = self.get_config("CustomSites")
+            if custom_sites_config and custom_sites_config.get("enabled"):
+                self._custom_sites_cache = custom_sites_config.get("sites") or []
         except Exception as e:
-            # logger.info(f"IP {ip} 检测Cloudflare节点异常: {e}")
-            pass
-        return False
+            logger.warning(f"获取自定义站点失败: {e}")
 
     def _get_selected_sites_info(self) -> List[Dict[str, Any]]:
         """
@@ -468,37 +1137,27 @@ class CFIPSelector(_PluginBase):
         if not self.siteoper:
             return infos
         try:
-            # 获取全部active站点id
-            all_ids = [str(site.id) for site in self.siteoper.list_active()]
-            # 获取全部自定义站点id
-            try:
-                custom_sites_config = self.get_config("CustomSites")
-                if custom_sites_config and custom_sites_config.get("enabled"):
-                    custom_sites = custom_sites_config.get("sites")
-                    all_ids += [str(site.get("id")) for site in custom_sites]
-            except Exception:
-                pass
+            # 获取全部active站点id和自定义站点id
+            all_ids = {str(site.id) for site in self._active_sites_cache}
+            all_ids.update(str(site.get("id")) for site in self._custom_sites_cache)
             # 如果没选，默认全部
-            sign_sites = self._sign_sites if self._sign_sites else all_ids
+            sign_sites = set(self._sign_sites) if self._sign_sites else all_ids
             # 内置站点
-            for site in self.siteoper.list_active():
+            for site in self._active_sites_cache:
                 if str(site.id) in sign_sites:
                     full_domain = self._get_site_full_domain(site)
                     infos.append({"id": str(site.id), "name": getattr(site, "name", str(site.id)), "domain": full_domain})
             # 自定义站点
             try:
-                custom_sites_config = self.get_config("CustomSites")
-                if custom_sites_config and custom_sites_config.get("enabled"):
-                    custom_sites = custom_sites_config.get("sites")
-                    for site in custom_sites:
-                        if str(site.get("id")) in sign_sites:
-                            # 对于自定义站点，使用新的域名获取逻辑
-                            domain = site.get("domain", "")
-                            if domain:
-                                # 检查是否包含前缀
-                                if not domain.startswith(('www.', 'pt.', 'tracker.', 'api.', 'cdn.', 'static.')):
-                                    domain = 'www.' + domain  # 默认添加www前缀
-                            infos.append({"id": str(site.get("id")), "name": site.get("name", str(site.get("id"))), "domain": domain})
+                for site in self._custom_sites_cache:
+                    if str(site.get("id")) in sign_sites:
+                        # 对于自定义站点，使用新的域名获取逻辑
+                        domain = site.get("domain", "")
+                        if domain:
+                            # 检查是否包含前缀
+                            if not domain.startswith(('www.', 'pt.', 'tracker.', 'api.', 'cdn.', 'static.')):
+                                domain = 'www.' + domain  # 默认添加www前缀
+                        infos.append({"id": str(site.get("id")), "name": site.get("name", str(site.get("id"))), "domain": domain})
             except Exception as e:
                 logger.warning(f"获取自定义站点失败: {e}")
         except Exception as e:
@@ -513,38 +1172,28 @@ class CFIPSelector(_PluginBase):
             return []
         domains = []
         try:
-            # 获取全部active站点id
-            all_ids = [str(site.id) for site in self.siteoper.list_active()]
-            # 获取全部自定义站点id
-            try:
-                custom_sites_config = self.get_config("CustomSites")
-                if custom_sites_config and custom_sites_config.get("enabled"):
-                    custom_sites = custom_sites_config.get("sites")
-                    all_ids += [str(site.get("id")) for site in custom_sites]
-            except Exception:
-                pass
+            # 获取全部active站点id和自定义站点id
+            all_ids = {str(site.id) for site in self._active_sites_cache}
+            all_ids.update(str(site.get("id")) for site in self._custom_sites_cache)
             # 如果没选，默认全部
-            sign_sites = self._sign_sites if self._sign_sites else all_ids
+            sign_sites = set(self._sign_sites) if self._sign_sites else all_ids
             # 获取内置站点
-            for site in self.siteoper.list_active():
+            for site in self._active_sites_cache:
                 if str(site.id) in sign_sites:
                     full_domain = self._get_site_full_domain(site)
                     if full_domain:  # 只添加非空域名
                         domains.append(full_domain)
             # 获取自定义站点
             try:
-                custom_sites_config = self.get_config("CustomSites")
-                if custom_sites_config and custom_sites_config.get("enabled"):
-                    custom_sites = custom_sites_config.get("sites")
-                    for site in custom_sites:
-                        if str(site.get("id")) in sign_sites:
-                            # 对于自定义站点，使用新的域名获取逻辑
-                            domain = site.get("domain", "")
-                            if domain:
-                                # 检查是否包含前缀
-                                if not domain.startswith(('www.', 'pt.', 'tracker.', 'api.', 'cdn.', 'static.')):
-                                    domain = 'www.' + domain  # 默认添加www前缀
-                                domains.append(domain)
+                for site in self._custom_sites_cache:
+                    if str(site.get("id")) in sign_sites:
+                        # 对于自定义站点，使用新的域名获取逻辑
+                        domain = site.get("domain", "")
+                        if domain:
+                            # 检查是否包含前缀
+                            if not domain.startswith(('www.', 'pt.', 'tracker.', 'api.', 'cdn.', 'static.')):
+                                domain = 'www.' + domain  # 默认添加www前缀
+                            domains.append(domain)
             except Exception as e:
                 logger.warning(f"获取自定义站点失败: {e}")
         except Exception as e:
@@ -552,10 +1201,12 @@ class CFIPSelector(_PluginBase):
         logger.info(f"选中的检测站点域名: {domains}")
         return domains
 
-    def _test_ip_with_sites(self, ip: str, domains: List[str], timeout: int = 5, loose_mode: bool = False, repeat: int = 1) -> Dict[str, Any]:
+    def _test_ip_with_sites(self, ip: str, domains: List[str], timeout: int = 5, loose_mode: bool = False, repeat: int = 1,
+                            stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
-        用临时hosts测试IP对站点的访问速度
+        将站点域名固定解析到该IP测试访问速度，同一IP的多次请求复用连接
         repeat>1时多次测速，全部成功才算可用
+        stop_event置位后在下一次请求前中止，本次测速按失败处理
         返回: {"total_delay": 总延迟, "success_count": 成功数, "total_count": 总数, "avg_delay": 平均延迟}
         loose_mode=True时，只要能连上就算成功（tracker专用）
         """
@@ -564,13 +1215,15 @@ class CFIPSelector(_PluginBase):
         total_delay = 0
         success_count = 0
         total_count = len(domains)
-        original_hosts = self._read_system_hosts()
         headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
-        try:
-            temp_hosts = []
-            for domain in domains:
-                temp_hosts.append(f"{ip} {domain}")
-            self._add_temp_hosts(temp_hosts)
+        with requests.Session() as session:
+            adapter = _PinnedIPAdapter(ip, domains, pool_connections=len(domains), pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(headers)
+            session.verify = False
+            # 测的是直连该IP的速度，不走环境变量中的代理
+            session.trust_env = False
             for domain in domains:
                 all_success = True
                 domain_total_delay = 0
@@ -583,8 +1236,11 @@ class CFIPSelector(_PluginBase):
                             url = f"http://{domain}"
                         max_retries = 2
                         for retry in range(max_retries):
+                            if stop_event is not None and stop_event.is_set():
+                                all_success = False
+                                break
                             try:
-                                response = requests.get(url, timeout=timeout, verify=False, headers=headers)
+                                response = session.get(url, timeout=timeout)
                                 if loose_mode:
                                     # 只要能连上就算成功
                                     delay = (time.time() - start_time) * 1000
@@ -626,8 +1282,6 @@ class CFIPSelector(_PluginBase):
                 if all_success:
                     total_delay += domain_total_delay / repeat
                     success_count += 1
-        finally:
-            self._restore_hosts(original_hosts)
         avg_delay = total_delay / success_count if success_count > 0 else 9999
         return {
             "total_delay": total_delay,
@@ -636,83 +1290,17 @@ class CFIPSelector(_PluginBase):
             "avg_delay": avg_delay
         }
 
-    def _read_system_hosts(self) -> str:
+    def _write_hosts_for_sites_multi(self, ip_map: Dict[str, str], sync_dns: bool = False) -> bool:
         """
-        读取系统hosts文件内容
-        """
-        try:
-            import platform
-            if platform.system() == "Windows":
-                hosts_path = r"c:\windows\system32\drivers\etc\hosts"
-            else:
-                hosts_path = '/etc/hosts'
-            
-            with open(hosts_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"读取系统hosts失败: {e}")
-            return ""
-
-    def _add_temp_hosts(self, hosts_lines: List[str]):
-        """
-        添加临时hosts条目
-        """
-        try:
-            import platform
-            if platform.system() == "Windows":
-                hosts_path = r"c:\windows\system32\drivers\etc\hosts"
-            else:
-                hosts_path = '/etc/hosts'
-            
-            with open(hosts_path, 'a', encoding='utf-8') as f:
-                f.write("\n# CFIPSelector临时测试\n")
-                for line in hosts_lines:
-                    f.write(f"{line}\n")
-        except Exception as e:
-            logger.error(f"添加临时hosts失败: {e}")
-
-    def _restore_hosts(self, original_content: str):
-        """
-        恢复原始hosts内容
-        """
-        try:
-            import platform
-            if platform.system() == "Windows":
-                hosts_path = r"c:\windows\system32\drivers\etc\hosts"
-            else:
-                hosts_path = '/etc/hosts'
-            
-            # 移除临时条目
-            lines = original_content.split('\n')
-            filtered_lines = []
-            skip_temp = False
-            
-            for line in lines:
-                if "# CFIPSelector临时测试" in line:
-                    skip_temp = True
-                    continue
-                if skip_temp and line.strip() == "":
-                    skip_temp = False
-                    continue
-                if skip_temp:
-                    continue
-                filtered_lines.append(line)
-            
-            with open(hosts_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(filtered_lines))
-        except Exception as e:
-            logger.error(f"恢复hosts失败: {e}")
-
-    def _write_hosts_for_sites_multi(self, ip_map: Dict[str, str]) -> bool:
-        """
-        将多个域名和IP写入hosts，指向优选IP，并同步到爱快路由器的 DNS 服务器
+        将多个域名和IP写入hosts，指向优选IP
+        sync_dns=True时同时同步到爱快路由器的 DNS 服务器（select_ips已自行处理DNS同步，默认不同步）
         """
         if not ip_map:
             logger.warning("没有优选IP，跳过hosts写入")
             return False
             
         # 同步到爱快路由器 DNS
-        if self._enable_ikuai_dns and self._ikuai_dns_manager:
+        if sync_dns and self._enable_ikuai_dns and self._ikuai_dns_manager:
             try:
                 # 转换为爱快 DNS 记录格式
                 hosts_list = [
@@ -730,43 +1318,18 @@ class CFIPSelector(_PluginBase):
                 logger.error(f"同步到爱快路由器 DNS 时发生错误: {str(e)}")
         
         try:
-            from python_hosts import Hosts, HostsEntry
-            import platform
-            
-            if platform.system() == "Windows":
-                hosts_path = r"c:\windows\system32\drivers\etc\hosts"
-            else:
-                hosts_path = '/etc/hosts'
-            
-            # 读取系统hosts
-            system_hosts = Hosts(path=hosts_path)
-            
-            # 移除所有旧的hosts条目，除了注释
-            original_entries = []
-            for entry in system_hosts.entries:
-                if entry.entry_type == "comment" and entry.comment == "# CFIPSelector优选IP":
-                    break
-                original_entries.append(entry)
-            system_hosts.entries = original_entries
-            
-            # 添加新的hosts条目
-            new_entries = []
-            new_entries.append(HostsEntry(entry_type='comment', comment="# CFIPSelector优选IP"))
+            hosts_path = _HOSTS_PATH
             
-            for domain, ip in ip_map.items():
-                try:
-                    host_entry = HostsEntry(
-                        entry_type='ipv6' if ':' in ip else 'ipv4',
-                        address=ip,
-                        names=[domain]
-                    )
-                    new_entries.append(host_entry)
-                except Exception as e:
-                    logger.error(f"创建hosts条目失败 {ip} {domain}: {e}")
+            # 读取系统hosts，移除旧的优选IP区块及旧版本残留的临时测试区块
+            with open(hosts_path, 'r', encoding='utf-8') as f:
+                content = _HOSTS_TEMP_RE.sub('', _HOSTS_BLOCK_RE.sub('', f.read()))
+            if content and not content.endswith('\n'):
+                content += '\n'
             
-            # 写入系统hosts
-            system_hosts.add(new_entries)
-            system_hosts.write()
+            # 追加新的优选IP区块
+            block = "\n".join(f"{ip}\t{domain}" for domain, ip in ip_map.items())
+            content += f"{_HOSTS_BLOCK_MARK}\n{block}\n"
+            self._replace_hosts_file(hosts_path, content)
             
             logger.info(f"成功写入hosts: {ip_map}")
             return True
@@ -775,229 +1338,137 @@ class CFIPSelector(_PluginBase):
             logger.error(f"写入hosts失败: {e}")
             return False
 
-    def _select_tracker_ips_from_list(self):
+    @staticmethod
+    def _replace_hosts_file(hosts_path: str, content: str):
         """
-        通过配置文件或内置tracker列表获取tracker域名，进行优选。
-        返回{tracker域名: 优选IP}
+        先写临时文件再原子替换hosts，读取方不会看到写了一半的文件
+        Docker中/etc/hosts为挂载文件无法替换，此时退回为一次性整体写入
         """
-        logger.info("[CFIPSelector] 开始通过配置文件/内置列表优选tracker...")
-        tracker_domains = self._get_tracker_domains_for_selection()
-        if not tracker_domains:
-            logger.warning("未检测到任何tracker域名，跳过优选。")
-            return {}
-        logger.info(f"[CFIPSelector] 最终参与优选的tracker: {list(tracker_domains)}")
-        ip_types = []
-        ip_type_str = str(getattr(self, '_ip_type', '4'))
-        if '4' in ip_type_str:
-            ip_types.append(4)
-        if '6' in ip_type_str:
-            ip_types.append(6)
-        if not ip_types:
-            logger.warning("IPv4/IPv6均未启用，不进行优选。")
-            return {}
-        locations = self._download_locations_json()
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        import random
-        domain_best_ip = {}
+        tmp_path = None
+        try:
+            # 临时文件名唯一，写入与清理同时发生时互不覆盖
+            fd, tmp_path = tempfile.mkstemp(prefix='.hosts.cfipselector.', dir=os.path.dirname(hosts_path))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            shutil.copymode(hosts_path, tmp_path)
+            os.replace(tmp_path, hosts_path)
+            return
+        except OSError:
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        with open(hosts_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def _select_best_ips(self, targets: Dict[str, bool], ip_types: List[int]) -> Dict[str, str]:
+        """
+        为PT站点和tracker域名统一优选IP，返回{域名: 优选IP}
+        每轮只采样一次IP池并做一次 ping筛选 → Cloudflare节点判断，确认的节点对所有待优选域名测速
+        仍未找到可用IP的域名进入下一轮，最多尝试max_rounds轮
+        targets: {域名: 是否宽松模式}
+        """
+        best: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        tried_ips = {ip_type: _TriedIPs() for ip_type in ip_types}
+        pending = dict(targets)
+        # 各域名的完整测速共用一个跨轮次复用的线程池
+        executor = self._get_speed_pool()
         max_rounds = 10  # 最多尝试10轮，防止死循环
-        for domain in tracker_domains:
-            logger.info(f"\n===== 开始为Tracker {domain} 独立优选IP =====")
-            best_ip = None
-            best_result = None
-            tried_ips = set()
-            round_idx = 0
-            while not (best_ip and best_result) and round_idx < max_rounds:
-                round_idx += 1
-                for ip_type in ip_types:
-                    all_ip_pool = self._get_ip_pool_by_datacenters(ip_type, [d.strip().upper() for d in self._datacenters.split(",") if d.strip()], max_per_net=10)
-                    ip_pool = [ip for ip in all_ip_pool if ip not in tried_ips]
-                    if not ip_pool:
-                        logger.warning(f"所有IP都已尝试，无法继续采样！[{domain}]")
-                        break
-                    if len(ip_pool) > self._cidr_sample_num:
-                        ip_pool = random.sample(ip_pool, self._cidr_sample_num)
-                    else:
-                        random.shuffle(ip_pool)
-                    tried_ips.update(ip_pool)
-                    logger.info(f"第{round_idx}轮：并发ping筛选低延迟IP（候选{len(ip_pool)}个）")
-                    ping_results = {}
-                    with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
-                        future_to_ip = {executor.submit(self._tcp_ping, ip, self._port, 1): ip for ip in ip_pool}
-                        for future in as_completed(future_to_ip):
-                            ip = future_to_ip[future]
-                            try:
-                                delay = future.result()
-                            except Exception:
-                                delay = 9999
-                            ping_results[ip] = delay
-                    sorted_ips = sorted(ping_results.items(), key=lambda x: x[1])
-                    candidate_ips = [ip for ip, delay in sorted_ips if delay < self._delay][:self._candidate_num]
-                    if not candidate_ips:
-                        logger.warning(f"第{round_idx}轮ping筛选后无可用IP！[{domain}]")
-                        continue
-                    logger.info(f"第{round_idx}轮：并发判断Cloudflare节点（候选{len(candidate_ips)}个）")
-                    cf_ips = []
-                    with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
-                        future_to_ip = {executor.submit(self._is_cf_node, ip, self._port, self._tls): ip for ip in candidate_ips}
-                        for future in as_completed(future_to_ip):
-                            ip = future_to_ip[future]
-                            try:
-                                is_cf = future.result()
-                            except Exception:
-                                is_cf = False
-                            if is_cf:
-                                cf_ips.append(ip)
-                    if not cf_ips:
-                        logger.warning(f"第{round_idx}轮Cloudflare节点筛选后无可用IP！[{domain}]")
-                        continue
-                    logger.info(f"第{round_idx}轮：并发完整测速（候选{len(cf_ips)}个）")
-                    logger.info(f"开始对{len(cf_ips)}个IP做完整测速，请稍候，预计需要{max(3, len(cf_ips)*2)}秒... [{domain}]")
-                    with ThreadPoolExecutor(max_workers=max(2, self._concurrency // 4)) as executor:
-                        future_to_ip = {executor.submit(self._test_ip_with_sites, ip, [domain], 5, True, 3): ip for ip in cf_ips}
-                        total = len(cf_ips)
-                        for idx, future in enumerate(as_completed(future_to_ip), 1):
-                            ip = future_to_ip[future]
-                            try:
-                                result = future.result()
-                            except Exception:
-                                result = {"success_count": 0, "avg_delay": 9999}
-                            logger.info(f"完整测速进度：{idx}/{total} [{domain}]")
-                            if result["success_count"] > 0:
-                                if best_result is None or result["avg_delay"] < best_result["avg_delay"]:
-                                    best_ip = ip
-                                    best_result = result
-            if best_ip and best_result:
-                logger.info(f"优选成功，Tracker {domain} -> {best_ip}")
-                domain_best_ip[domain] = best_ip
+        round_idx = 0
+        while pending and round_idx < max_rounds:
+            round_idx += 1
+            sampled = False
+            for ip_type in ip_types:
+                ip_pool = self._get_ip_pool_by_datacenters(ip_type, self._parsed_datacenters, max_per_net=10,
+                                                           sample_k=self._cidr_sample_num, exclude=tried_ips[ip_type])
+                if not ip_pool:
+                    logger.warning(f"所有IPv{ip_type} IP都已尝试，无法继续采样！")
+                    continue
+                sampled = True
+                tried_ips[ip_type].update(ip_pool)
+                logger.info(f"第{round_idx}轮：并发ping筛选低延迟IP并判断Cloudflare节点（候选{len(ip_pool)}个，待优选域名{len(pending)}个）")
+                # 对于IPv6，如果Cloudflare节点检测失败，跳过此步骤直接测速
+                round_best = self._pipeline_select(ip_pool, pending, round_idx, executor,
+                                                   fallback_non_cf=(ip_type == 6))
+                for domain, (ip, result) in round_best.items():
+                    if domain not in best or result["avg_delay"] < best[domain][1]["avg_delay"]:
+                        best[domain] = (ip, result)
+            if not sampled:
+                break
+            # 只要找到可用IP的域名就不再参与后续轮次
+            pending = {domain: loose_mode for domain, loose_mode in pending.items() if domain not in best}
+        domain_best_ip = {}
+        for domain, loose_mode in targets.items():
+            kind = "Tracker" if loose_mode else "站点"
+            if domain in best:
+                logger.info(f"优选成功，{kind} {domain} -> {best[domain][0]}")
+                domain_best_ip[domain] = best[domain][0]
             else:
-                logger.warning(f"Tracker {domain} 未找到可用IP！")
+                logger.warning(f"{kind} {domain} 未找到可用IP！")
         return domain_best_ip
 
     @eventmanager.register(EventType.PluginAction)
     def select_ips(self, event: Event = None):
         try:
             logger.info("开始优选IP...")
+            # 每次优选前刷新一次站点缓存，后续站点筛选不再重复查询
+            self._refresh_sites()
             
             # 检查IPv6配置，如果启用IPv6则给出警告
             ip_type_str = str(getattr(self, '_ip_type', '4'))
             if '6' in ip_type_str:
                 logger.warning("检测到IPv6配置，已启用内存保护机制。如果遇到内存问题，建议仅使用IPv4配置。")
+            ip_types = []
+            if '4' in ip_type_str:
+                ip_types.append(4)
+            if '6' in ip_type_str:
+                ip_types.append(6)
+            if not ip_types:
+                logger.warning("IPv4/IPv6均未启用，不进行优选。")
+                return
             
-            test_sites_info = self._get_selected_sites_info()
-            domain_best_ip = {}
-            max_rounds = 10  # 最多尝试10轮，防止死循环
-            # 1. 优选PT站点域名
+            # 1. 收集待优选域名：PT站点要求返回200，tracker能连上即可（宽松模式）
+            targets: Dict[str, bool] = {}
             if self._enable_site_select:
+                test_sites_info = self._get_selected_sites_info()
                 if test_sites_info:
-                    ip_types = []
-                    ip_type_str = str(getattr(self, '_ip_type', '4'))
-                    if '4' in ip_type_str:
-                        ip_types.append(4)
-                    if '6' in ip_type_str:
-                        ip_types.append(6)
-                    if not ip_types:
-                        logger.warning("IPv4/IPv6均未启用，不进行优选。")
-                        return
-                    locations = self._download_locations_json()
-                    from concurrent.futures import ThreadPoolExecutor, as_completed
-                    import random
-                    for site_info in test_sites_info:
-                        domain = site_info["domain"]
-                        logger.info(f"\n===== 开始为站点 {domain} 独立优选IP =====")
-                        best_ip = None
-                        best_result = None
-                        tried_ips = set()
-                        round_idx = 0
-                        while not (best_ip and best_result) and round_idx < max_rounds:
-                            round_idx += 1
-                            for ip_type in ip_types:
-                                all_ip_pool = self._get_ip_pool_by_datacenters(ip_type, [d.strip().upper() for d in self._datacenters.split(",") if d.strip()], max_per_net=10)
-                                ip_pool = [ip for ip in all_ip_pool if ip not in tried_ips]
-                                if not ip_pool:
-                                    logger.warning(f"所有IP都已尝试，无法继续采样！[{domain}]")
-                                    break
-                                if len(ip_pool) > self._cidr_sample_num:
-                                    ip_pool = random.sample(ip_pool, self._cidr_sample_num)
-                                else:
-                                    random.shuffle(ip_pool)
-                                tried_ips.update(ip_pool)
-                                logger.info(f"第{round_idx}轮：并发ping筛选低延迟IP（候选{len(ip_pool)}个）")
-                                ping_results = {}
-                                with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
-                                    future_to_ip = {executor.submit(self._tcp_ping, ip, self._port, 1): ip for ip in ip_pool}
-                                    for future in as_completed(future_to_ip):
-                                        ip = future_to_ip[future]
-                                        try:
-                                            delay = future.result()
-                                        except Exception:
-                                            delay = 9999
-                                        ping_results[ip] = delay
-                                sorted_ips = sorted(ping_results.items(), key=lambda x: x[1])
-                                candidate_ips = [ip for ip, delay in sorted_ips if delay < self._delay][:self._candidate_num]
-                                if not candidate_ips:
-                                    logger.warning(f"第{round_idx}轮ping筛选后无可用IP！[{domain}]")
-                                    continue
-                                logger.info(f"第{round_idx}轮：并发判断Cloudflare节点（候选{len(candidate_ips)}个）")
-                                cf_ips = []
-                                with ThreadPoolExecutor(max_workers=self._concurrency) as executor:
-                                    future_to_ip = {executor.submit(self._is_cf_node, ip, self._port, self._tls): ip for ip in candidate_ips}
-                                    for future in as_completed(future_to_ip):
-                                        ip = future_to_ip[future]
-                                        try:
-                                            is_cf = future.result()
-                                        except Exception:
-                                            is_cf = False
-                                        if is_cf:
-                                            cf_ips.append(ip)
-                                if not cf_ips:
-                                    logger.warning(f"第{round_idx}轮Cloudflare节点筛选后无可用IP！[{domain}]")
-                                    # 对于IPv6，如果Cloudflare节点检测失败，尝试跳过此步骤
-                                    if ip_type == 6:
-                                        logger.info(f"IPv6模式：跳过Cloudflare节点检测，直接使用ping筛选的候选IP进行测速")
-                                        cf_ips = candidate_ips
-                                    else:
-                                        continue
-                                logger.info(f"第{round_idx}轮：并发完整测速（候选{len(cf_ips)}个）")
-                                logger.info(f"开始对{len(cf_ips)}个IP做完整测速，请稍候，预计需要{max(3, len(cf_ips)*2)}秒... [{domain}]")
-                                with ThreadPoolExecutor(max_workers=max(2, self._concurrency // 4)) as executor:
-                                    future_to_ip = {executor.submit(self._test_ip_with_sites, ip, [domain], 5, False, 3): ip for ip in cf_ips}
-                                    total = len(cf_ips)
-                                    for idx, future in enumerate(as_completed(future_to_ip), 1):
-                                        ip = future_to_ip[future]
-                                        try:
-                                            result = future.result()
-                                        except Exception:
-                                            result = {"success_count": 0, "avg_delay": 9999}
-                                        logger.info(f"完整测速进度：{idx}/{total} [{domain}]")
-                                        if result["success_count"] > 0:
-                                            if best_result is None or result["avg_delay"] < best_result["avg_delay"]:
-                                                best_ip = ip
-                                                best_result = result
-                            # 只要找到可用IP就break
-                        if best_ip and best_result:
-                            logger.info(f"优选成功，站点 {domain} -> {best_ip}")
-                            domain_best_ip[domain] = best_ip
-                        else:
-                            logger.warning(f"站点 {domain} 未找到可用IP！")
+                    targets.update((site_info["domain"], False) for site_info in test_sites_info)
                 else:
                     logger.warning("未选择检测站点，跳过PT站点优选。")
-
-            # 2. 优选tracker域名（通过配置/内置列表，不依赖下载器）
-            tracker_best_ip = {}
+            # 2. tracker域名（通过配置/内置列表，不依赖下载器），与站点重复时保留站点的严格模式
             if self._enable_tracker_select:
-                try:
-                    tracker_best_ip = self._select_tracker_ips_from_list()
-                except Exception as e:
-                    logger.error(f"tracker优选流程异常: {e}")
+                logger.info("[CFIPSelector] 开始通过配置文件/内置列表优选tracker...")
+                # 等待插件加载时的tracker同步完成，避免读取到旧的或缺失的tracker列表
+                if self._trackers_ready and not self._trackers_ready.wait(timeout=30):
+                    logger.warning("[CFIPSelector] 等待tracker列表同步超时，使用现有列表")
+                tracker_domains = self._get_tracker_domains_for_selection()
+                if tracker_domains:
+                    logger.info(f"[CFIPSelector] 最终参与优选的tracker: {list(tracker_domains)}")
+                    for domain in tracker_domains:
+                        targets.setdefault(domain, True)
+                else:
+                    logger.warning("未检测到任何tracker域名，跳过优选。")
+
+            merged_ip_map = self._select_best_ips(targets, ip_types) if targets else {}
 
-            # 3. 合并PT站点和tracker优选结果，根据配置选择写入方式
-            merged_ip_map = {**domain_best_ip, **tracker_best_ip}
+            # 3. 根据配置选择写入方式
             if merged_ip_map:
                 hosts_status = False
                 sync_message = ""
                 
+                # 写入目标也计入签名，切换hosts/爱快DNS后需要重新写入
+                use_ikuai_dns = bool(self._enable_ikuai_dns and self._ikuai_dns_manager)
+                ip_map_sig = self._ip_map_signature(merged_ip_map, "ikuai" if use_ikuai_dns else "hosts")
+                # hosts可能被清理或随容器重建，写入hosts时还需确认优选区块仍在文件中
+                unchanged = ip_map_sig == self._last_ip_map_sig and (
+                    use_ikuai_dns or self._hosts_block_present())
+                if unchanged:
+                    logger.info("优选结果无变化，跳过写入")
+                    hosts_status = True
+                    sync_message = "优选结果无变化，跳过写入"
                 # 如果启用了爱快DNS同步，则只写入DNS不写hosts
-                if self._enable_ikuai_dns and self._ikuai_dns_manager:
+                elif use_ikuai_dns:
                     # 同步到爱快DNS
                     dns_records = [{"domain": domain, "ip": ip} for domain, ip in merged_ip_map.items()]
                     if self._ikuai_dns_manager.sync_hosts_to_dns(dns_records):
@@ -1011,20 +1482,23 @@ class CFIPSelector(_PluginBase):
                     # 不执行本地hosts写入
                 else:
                     # 没有启用爱快DNS同步，则写入本地hosts
-                    hosts_status = self._write_hosts_for_sites_multi(merged_ip_map)
+                    hosts_status = self._write_hosts_for_sites_multi(merged_ip_map, sync_dns=False)
                     sync_message = "本地hosts更新"
+                if hosts_status:
+                    self._last_ip_map_sig = ip_map_sig
                 
                 # 获取DNS同步状态
                 ikuai_dns_status = None
                 if self._enable_ikuai_dns:
-                    if self._ikuai_dns_manager and hasattr(self._ikuai_dns_manager, '_last_sync_success'):
+                    if unchanged:
+                        ikuai_dns_status = "无变化"
+                    elif self._ikuai_dns_manager and hasattr(self._ikuai_dns_manager, '_last_sync_success'):
                         ikuai_dns_status = "成功" if self._ikuai_dns_manager._last_sync_success else "失败"
                     else:
                         ikuai_dns_status = "配置异常"
 
                 # 更新最后优选时间和IP
                 if hosts_status:
-                    from datetime import datetime
                     self._last_select_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     self._last_selected_ip = ", ".join([f"{d}:{ip}" for d, ip in merged_ip_map.items()])
                     self.__update_config()
@@ -1049,6 +1523,14 @@ class CFIPSelector(_PluginBase):
         except Exception as e:
             logger.error(f"select_ips主流程异常: {e}")
 
+    @staticmethod
+    def _ip_map_signature(ip_map: Dict[str, str], target: str) -> str:
+        """
+        计算优选结果的签名（与写入目标一起哈希），用于判断与上次写入是否一致
+        """
+        payload = repr((target, sorted(ip_map.items()))).encode()
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
     def _send_notification(self, success: bool, message: str = "", result: Optional[List[Dict[str, Any]]] = None, 
                        hosts_status: Optional[bool] = None, ikuai_dns_status: Optional[str] = None):
         if not self._notify:
@@ -1164,7 +1646,6 @@ class CFIPSelector(_PluginBase):
         """
         同步数据中心映射表：直接处理resources/locations_raw.json
         """
-        import json
         plugin_dir = os.path.dirname(__file__)
         raw_path = os.path.join(plugin_dir, 'resources', 'locations_raw.json')
         out_path = os.path.join(plugin_dir, 'resources', 'locations.json')
@@ -1178,6 +1659,17 @@ class CFIPSelector(_PluginBase):
             return {"success": False, "msg": "未找到resources/locations_raw.json，请先上传原始数据！"}
         
         try:
+            # 列表格式且ijson可用时流式转换，避免原始数据与结果同时驻留内存
+            if IJSON_AVAILABLE and self._json_top_char(raw_path) == '[':
+                logger.info(f"开始流式转换原始数据文件: {raw_path}")
+                try:
+                    count = self._stream_locations_list(raw_path, out_path)
+                except ijson.JSONError as e:
+                    logger.error(f"JSON解析失败: {e}")
+                    return {"success": False, "msg": f"JSON解析失败：{e}"}
+                logger.info(f"同步成功！共处理{count}个数据中心")
+                return {"success": True, "msg": f"同步成功！共处理{count}个数据中心"}
+
             # 读取原始数据
             logger.info(f"开始读取原始数据文件: {raw_path}")
             with open(raw_path, 'r', encoding='utf-8') as f:
@@ -1215,6 +1707,47 @@ class CFIPSelector(_PluginBase):
             logger.error(f"同步异常: {e}")
             return {"success": False, "msg": f"同步异常：{e}"}
 
+    @staticmethod
+    def _json_top_char(path: str) -> str:
+        """
+        返回JSON文件首个非空白字符，用于不解析全文判断顶层是列表还是字典
+        """
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            while True:
+                chunk = f.read(256)
+                if not chunk:
+                    return ''
+                stripped = chunk.lstrip()
+                if stripped:
+                    return stripped[0]
+
+    @staticmethod
+    def _stream_locations_list(raw_path: str, out_path: str) -> int:
+        """
+        用ijson逐项读取列表格式的原始数据，边解析边写出{code: {name, nets}}，返回写出的数据中心数
+        先写临时文件再替换，解析失败时不会留下半截的locations.json
+        """
+        tmp_path = out_path + '.tmp'
+        count = 0
+        try:
+            with open(raw_path, 'rb') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+                dst.write('{')
+                for item in ijson.items(src, 'item'):
+                    if not (isinstance(item, dict) and 'code' in item and 'nets' in item):
+                        continue
+                    entry = {'name': item.get('name', item['code']), 'nets': item['nets']}
+                    dst.write(',\n  ' if count else '\n  ')
+                    dst.write(json.dumps(str(item['code']), ensure_ascii=False))
+                    dst.write(': ')
+                    dst.write(json.dumps(entry, ensure_ascii=False, default=str))
+                    count += 1
+                dst.write('\n}\n')
+            os.replace(tmp_path, out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return count
+
     def sync_trackers_from_github(self, url: str = None):
         """
         从GitHub拉取tracker列表并写入trackers_include.txt，支持代理
@@ -1222,72 +1755,64 @@ class CFIPSelector(_PluginBase):
         if not url:
             url = getattr(self, '_github_tracker_url', None) or "https://raw.githubusercontent.com/MJinxi/Rule/main/rules/trackers.list"
         try:
-            resp = requests.get(url, timeout=10, proxies=getattr(settings, 'PROXY', None))
-            if resp.status_code == 200:
-                lines = [line.strip() for line in resp.text.splitlines() if line.strip()]
-                from pathlib import Path
+            with _HTTP.get(url, timeout=10, stream=True, proxies=getattr(settings, 'PROXY', None)) as resp:
+                if resp.status_code != 200:
+                    logger.error(f"拉取GitHub tracker列表失败，状态码: {resp.status_code}")
+                    return False, f"拉取失败，状态码: {resp.status_code}"
+                resp.encoding = resp.encoding or 'utf-8'
                 Path('/config/plugins/CFIPSelector').mkdir(parents=True, exist_ok=True)
                 include_path = '/config/plugins/CFIPSelector/trackers_include.txt'
-                with open(include_path, 'w', encoding='utf-8') as f:
-                    for line in lines:
-                        f.write(line + '\n')
-                logger.info(f"同步GitHub tracker列表成功，共{len(lines)}个")
-                return True, f"同步成功，共{len(lines)}个tracker"
-            else:
-                logger.error(f"拉取GitHub tracker列表失败，状态码: {resp.status_code}")
-                return False, f"拉取失败，状态码: {resp.status_code}"
+                # 边下载边写入临时文件，完成后再替换，下载中断时不破坏原文件
+                tmp_path = f"{include_path}.tmp"
+                count = 0
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for raw in resp.iter_lines(decode_unicode=True):
+                        line = raw.strip() if raw else ''
+                        if line:
+                            f.write(line + '\n')
+                            count += 1
+                os.replace(tmp_path, include_path)
+            logger.info(f"同步GitHub tracker列表成功，共{count}个")
+            return True, f"同步成功，共{count}个tracker"
         except Exception as e:
             logger.error(f"同步GitHub tracker列表异常: {e}")
             return False, f"同步异常: {e}"
 
-    def _get_tracker_domains_for_selection(self) -> set:
+    def _get_tracker_domains_for_selection(self) -> frozenset:
         """
         只读取trackers_include.txt（由GitHub同步和UI输入共同维护），支持DOMAIN-SUFFIX,xxx等格式自动提取域名
+        解析结果按文件修改时间缓存，文件未变化时直接复用
         """
         include_path = '/config/plugins/CFIPSelector/trackers_include.txt'
+        try:
+            mtime = os.stat(include_path).st_mtime_ns
+        except OSError:
+            self._tracker_cache = None
+            return frozenset()
+        if self._tracker_cache and self._tracker_cache[0] == mtime:
+            return self._tracker_cache[1]
         tracker_domains = set()
-        import os
-        if os.path.exists(include_path):
-            with open(include_path, 'r', encoding='utf-8-sig') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    if ',' in line:
-                        parts = line.split(',', 1)
-                        domain = parts[1].strip()
-                        if domain:
-                            tracker_domains.add(domain.lower())
-                    else:
-                        tracker_domains.add(line.lower())
-        return tracker_domains
+        with open(include_path, 'r', encoding='utf-8-sig') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if ',' in line:
+                    parts = line.split(',', 1)
+                    domain = parts[1].strip()
+                    if domain:
+                        tracker_domains.add(domain.lower())
+                else:
+                    tracker_domains.add(line.lower())
+        self._tracker_cache = (mtime, frozenset(tracker_domains))
+        return self._tracker_cache[1]
 
-    def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
-        site_options = []
-        try:
-            from app.db.site_oper import SiteOper
-            siteoper = SiteOper()
-            custom_sites = []
-            try:
-                custom_sites_config = self.get_config("CustomSites")
-                if custom_sites_config and custom_sites_config.get("enabled"):
-                    custom_sites = custom_sites_config.get("sites")
-            except Exception:
-                pass
-            site_options = ([{"title": site.name, "value": str(site.id)} for site in siteoper.list_active()] +
-                            [{"title": site.get("name"), "value": str(site.get("id"))} for site in custom_sites])
-        except Exception as e:
-            logger.warning(f"获取站点选项失败: {e}")
-        # 新增：读取trackers_include.txt内容作为默认值（始终优先显示文件内容）
-        tracker_include_default = ''
-        try:
-            include_path = '/config/plugins/CFIPSelector/trackers_include.txt'
-            if os.path.exists(include_path):
-                with open(include_path, 'r', encoding='utf-8-sig') as f:
-                    tracker_include_default = f.read().strip()
-        except Exception:
-            pass
-        form = [
+    @staticmethod
+    def _build_form_layout() -> List[dict]:
+        """
+        配置页静态布局（不含站点选项），只在首次打开配置页时构建一次
+        """
+        return [
             {
                 'component': 'VForm',
                 'content': [
@@ -1397,7 +1922,7 @@ class CFIPSelector(_PluginBase):
                                     'multiple': True,
                                     'model': 'sign_sites',
                                     'label': '检测站点',
-                                    'items': site_options,
+                                    'items': [],
                                     'item-title': 'title',
                                     'item-value': 'value',
                                     'hint': '选择需要测速和加速的站点，可多选',
@@ -1419,7 +1944,7 @@ class CFIPSelector(_PluginBase):
                         'component': 'VRow',
                         'content': [
                             {'component': 'VCol', 'props': {'cols': 6, 'md': 6}, 'content': [
-                                {'component': 'VTextField', 'props': {'model': 'candidate_num', 'label': '候选数量', 'placeholder': '20', 'prepend-inner-icon': 'mdi-account-multiple', 'hint': '第二阶段参与Cloudflare节点判断的IP数量', 'persistent-hint': True}}]},
+                                {'component': 'VTextField', 'props': {'model': 'candidate_num', 'label': '候选数量', 'placeholder': '20', 'prepend-inner-icon': 'mdi-account-multiple', 'hint': '参与完整测速的IP数量，Cloudflare节点判断取其5倍', 'persistent-hint': True}}]},
                             {'component': 'VCol', 'props': {'cols': 6, 'md': 6}, 'content': [
                                 {'component': 'VTextField', 'props': {'model': 'ipnum', 'label': '优选数量', 'placeholder': '10', 'prepend-inner-icon': 'mdi-counter', 'hint': '最终选出多少个最优IP', 'persistent-hint': True}}]},
                         ]
@@ -1494,7 +2019,73 @@ class CFIPSelector(_PluginBase):
                 ]
             }
         ]
-        model = {
+
+    @staticmethod
+    def _find_form_path(nodes: List[dict], model: str) -> Optional[List[int]]:
+        """
+        在表单布局中查找绑定指定model的组件，返回逐层的content下标路径
+        """
+        for idx, node in enumerate(nodes):
+            if node.get('props', {}).get('model') == model:
+                return [idx]
+            found = CFIPSelector._find_form_path(node.get('content', []), model)
+            if found is not None:
+                return [idx] + found
+        return None
+
+    def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
+        return self._form_layout(), self._form_model()
+
+    def _form_layout(self) -> List[dict]:
+        """
+        配置页布局：缓存的静态布局副本，填入当前可选站点
+        """
+        site_options = []
+        try:
+            from app.db.site_oper import SiteOper
+            siteoper = SiteOper()
+            custom_sites = []
+            try:
+                custom_sites_config = self.get_config("CustomSites")
+                if custom_sites_config and custom_sites_config.get("enabled"):
+                    custom_sites = custom_sites_config.get("sites")
+            except Exception:
+                pass
+            site_options = ([{"title": site.name, "value": str(site.id)} for site in siteoper.list_active()] +
+                            [{"title": site.get("name"), "value": str(site.get("id"))} for site in custom_sites])
+        except Exception as e:
+            logger.warning(f"获取站点选项失败: {e}")
+        # 静态布局只构建一次，每次仅浅拷贝通往站点选择组件的路径再填入站点选项，其余节点共享
+        if self._form_layout_cache is None:
+            CFIPSelector._form_layout_cache = self._build_form_layout()
+            CFIPSelector._form_sign_sites_path = self._find_form_path(self._form_layout_cache, 'sign_sites')
+        form = list(self._form_layout_cache)
+        level = form
+        node = None
+        for idx in self._form_sign_sites_path or []:
+            node = dict(level[idx])
+            level[idx] = node
+            if 'content' in node:
+                node['content'] = list(node['content'])
+                level = node['content']
+        if node is not None:
+            node['props'] = dict(node['props'], items=site_options)
+        return form
+
+    def _form_model(self) -> Dict[str, Any]:
+        """
+        配置页数据：当前配置值
+        """
+        # 新增：读取trackers_include.txt内容作为默认值（始终优先显示文件内容）
+        tracker_include_default = ''
+        try:
+            include_path = '/config/plugins/CFIPSelector/trackers_include.txt'
+            if os.path.exists(include_path):
+                with open(include_path, 'r', encoding='utf-8-sig') as f:
+                    tracker_include_default = f.read().strip()
+        except Exception:
+            pass
+        return {
             "enabled": self._enabled,
             "notify": self._notify,
             "cron": self._cron,
@@ -1521,24 +2112,46 @@ class CFIPSelector(_PluginBase):
             "ikuai_username": self._ikuai_username,
             "ikuai_password": self._ikuai_password,
         }
-        return form, model
 
     def _check_network_connectivity(self) -> bool:
         """
-        检测网络连接状态
+        检测网络连接状态，结果缓存_net_cache_ttl秒，避免每次打开页面都建立连接
         """
-        try:
-            import socket
-            # 测试连接到Google DNS
-            socket.create_connection(("8.8.8.8", 53), timeout=3)
-            return True
-        except Exception:
+        if time.monotonic() < self._net_cache[0]:
+            return self._net_cache[1]
+        with self._net_lock:
+            # 等锁期间其他请求可能已刷新结果
+            if time.monotonic() < self._net_cache[0]:
+                return self._net_cache[1]
+            # 同时连接Google DNS与Cloudflare DNS，任一成功即视为连通
             try:
-                # 备用测试：连接到Cloudflare DNS
-                socket.create_connection(("1.1.1.1", 53), timeout=3)
-                return True
+                connected = self._run_async(self._any_reachable_async([("8.8.8.8", 53), ("1.1.1.1", 53)], 1))
             except Exception:
-                return False
+                connected = False
+            self._net_cache = (time.monotonic() + self._net_cache_ttl, connected)
+            return connected
+
+    async def _any_reachable_async(self, targets: List[Tuple[str, int]], timeout: float) -> bool:
+        """
+        并发连接多个地址，任一连接成功立即返回True，全部失败或超时返回False
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending = {asyncio.ensure_future(self._tcp_ping_async(ip, port)) for ip, port in targets}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - loop.time()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    return False
+                if any(not task.exception() and task.result() < 9999 for task in done):
+                    return True
+            return False
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
 
     def _check_selection_status(self) -> bool:
         """
@@ -1550,81 +2163,61 @@ class CFIPSelector(_PluginBase):
         has_selected_ip = bool(getattr(self, '_last_selected_ip', '') and 
                               getattr(self, '_last_selected_ip', '') != '暂无')
         
-        # 检查hosts文件中是否有优选IP条目
+        # 检查hosts文件中是否有优选IP条目，hosts未修改时直接复用上次结果
         has_hosts_entries = False
         try:
-            import platform
-            if platform.system() == "Windows":
-                hosts_path = r"c:\windows\system32\drivers\etc\hosts"
-            else:
-                hosts_path = '/etc/hosts'
+            hosts_path = _HOSTS_PATH
             
+            mtime = os.stat(hosts_path).st_mtime_ns
+            if self._hosts_cache and self._hosts_cache[0] == mtime:
+                return has_selection_time and has_selected_ip and self._hosts_cache[1]
             with open(hosts_path, 'r', encoding='utf-8') as f:
                 content = f.read()
-                if "# CFIPSelector优选IP" in content:
-                    # 检查是否有实际的IP条目（不是只有注释）
-                    lines = content.split('\n')
-                    for line in lines:
-                        if line.strip() and not line.startswith('#') and not line.startswith('#'):
-                            # 检查是否是IP地址格式
-                            parts = line.strip().split()
-                            if len(parts) >= 2:
-                                ip_part = parts[0]
-                                if '.' in ip_part or ':' in ip_part:  # IPv4或IPv6
-                                    has_hosts_entries = True
-                                    break
+            # 优选IP标记行后至少紧跟一条“IP 域名”条目（不是只有注释）
+            has_hosts_entries = _HOSTS_ENTRY_RE.search(content) is not None
+            self._hosts_cache = (mtime, has_hosts_entries)
         except Exception:
             pass
         
         return has_selection_time and has_selected_ip and has_hosts_entries
 
+    def _chip_color(self, name: str) -> str:
+        """
+        按站点名取固定的芯片颜色，结果缓存复用
+        使用crc32而非hash()，重启后同一站点颜色不变
+        """
+        if not name:
+            return 'primary'
+        color = self._chip_color_cache.get(name)
+        if color is None:
+            color = self._chip_color_cache[name] = _CHIP_COLORS[zlib.crc32(name.encode('utf-8')) % len(_CHIP_COLORS)]
+        return color
+
     def get_page(self) -> List[dict]:
-        import random
         enabled = self._enabled
         datacenters = self._datacenters
         last_select_time = getattr(self, '_last_select_time', '暂无记录')
         last_ip = getattr(self, '_last_selected_ip', '暂无')
-        sign_sites = self._sign_sites or []
+        sign_sites = frozenset(map(str, self._sign_sites or []))
+        # 使用init_plugin/优选时刷新的站点缓存，渲染页面不再查询数据库
         site_names = []
-        if hasattr(self, 'siteoper') and self.siteoper:
-            try:
-                for site in self.siteoper.list_active():
-                    if str(site.id) in sign_sites:
-                        site_names.append(getattr(site, 'name', str(site.id)))
-            except Exception:
-                pass
+        if sign_sites:
+            for site in self._active_sites_cache:
+                if str(site.id) in sign_sites:
+                    site_names.append(getattr(site, 'name', str(site.id)))
         
         # 检测状态
         network_connected = self._check_network_connectivity()
         selection_success = self._check_selection_status()
         
-        # 根据状态决定颜色
-        color_choices = ['info', 'success', 'primary', 'warning', 'error', 'secondary']
-        
-        # 检测站点芯片颜色
-        chips = []
-        def get_fixed_color(name):
-            color_choices = ['info', 'success', 'primary', 'warning', 'error', 'secondary']
-            if not name:
-                return 'primary'
-            idx = abs(hash(name)) % len(color_choices)
-            return color_choices[idx]
-        for name in site_names:
-            if network_connected and selection_success:
-                # 网络连接正常且优选成功，使用固定颜色
-                chip_color = get_fixed_color(name)
-            else:
-                # 网络连接异常或优选失败，使用灰色
-                chip_color = 'grey'
-            chips.append({
-                'component': 'VChip',
-                'props': {
-                    'color': chip_color,
-                    'label': True,
-                    'class': 'ma-1'
-                },
-                'text': name
-            })
+        # 检测站点芯片颜色：网络连接正常且优选成功时按站点名取固定颜色，否则统一为灰色
+        # 同色芯片共用一份props，只有文字各不相同
+        colored = network_connected and selection_success
+        chip_color = self._chip_color
+        chip_props = {color: {'color': color, 'label': True, 'class': 'ma-1'}
+                      for color in (_CHIP_COLORS if colored else ('grey',))}
+        chips = [{'component': 'VChip', 'props': chip_props[chip_color(name) if colored else 'grey'], 'text': name}
+                 for name in site_names]
         
         # 状态卡片颜色
         def get_status_color():
@@ -1696,6 +2289,13 @@ class CFIPSelector(_PluginBase):
         if self._scheduler and self._scheduler.running:
             self._scheduler.shutdown()
             self._scheduler = None
+        self._scheduled_cron = None
+        if self._speed_pool:
+            self._speed_pool.shutdown(wait=False, cancel_futures=True)
+            self._speed_pool = None
+        self._active_sites_cache = []
+        self._custom_sites_cache = []
+        self._site_domain_cache = {}
 
     def post_message(self, channel=None, mtype=None, title=None, text=None, image=None, link=None, userid=None):
         """
@@ -1716,62 +2316,65 @@ class CFIPSelector(_PluginBase):
         移除/etc/hosts中# CFIPSelector优选IP及其后面的条目
         """
         try:
-            import platform
-            if platform.system() == "Windows":
-                hosts_path = r"c:\windows\system32\drivers\etc\hosts"
-            else:
-                hosts_path = '/etc/hosts'
+            hosts_path = _HOSTS_PATH
             with open(hosts_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            new_lines = []
-            skip = False
-            for line in lines:
-                if line.strip() == "# CFIPSelector优选IP":
-                    # 跳过该注释及其后所有非注释、非空行（即优选IP条目）
-                    skip = True
-                    continue
-                if skip:
-                    # 如果遇到下一个注释或空行，停止跳过
-                    if line.strip().startswith('#') or not line.strip():
-                        skip = False
-                        new_lines.append(line)
-                    # 否则继续跳过
-                    continue
-                new_lines.append(line)
-            with open(hosts_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
+                content = f.read()
+            # 移除优选IP区块（标记行及其后的非注释、非空行），没有区块时不写文件
+            if _HOSTS_BLOCK_MARK in content:
+                new_content = _HOSTS_BLOCK_RE.sub('', content)
+                if new_content != content:
+                    self._replace_hosts_file(hosts_path, new_content)
+            # hosts条目已移除，下次优选需重新写入，并持久化清空后的签名
+            if self._last_ip_map_sig:
+                self._last_ip_map_sig = ""
+                self.__update_config()
             #logger.info("已清理/etc/hosts中的CFIPSelector优选IP条目")
         except Exception as e:
             logger.error(f"清理hosts失败: {e}") 
 
+    @staticmethod
+    def _hosts_block_present() -> bool:
+        """
+        /etc/hosts中是否存在带条目的优选IP区块
+        """
+        try:
+            with open(_HOSTS_PATH, 'r', encoding='utf-8') as f:
+                return _HOSTS_ENTRY_RE.search(f.read()) is not None
+        except Exception:
+            return False
+
     def _get_site_full_domain(self, site) -> str:
         """
         获取站点的完整域名，优先从MoviePilot站点配置中获取
+        结果按站点id缓存，同一轮优选中站点筛选和结果通知共用，刷新站点列表时失效
+        """
+        site_id = getattr(site, 'id', None)
+        if site_id is not None and site_id in self._site_domain_cache:
+            return self._site_domain_cache[site_id]
+        domain = self._resolve_site_full_domain(site)
+        if site_id is not None:
+            self._site_domain_cache[site_id] = domain
+        return domain
+
+    def _resolve_site_full_domain(self, site) -> str:
+        """
+        依次从site.url、site.address、site.domain中解析站点域名
         """
         # 1. 优先使用site.url字段（MoviePilot中通常包含完整的访问地址）
-        if hasattr(site, 'url') and site.url:
-            try:
-                from urllib.parse import urlparse
-                parsed = urlparse(site.url)
-                if parsed.netloc:
-                    logger.debug(f"从site.url获取域名: {parsed.netloc}")
-                    return parsed.netloc
-            except Exception:
-                pass
+        url = getattr(site, 'url', None)
+        if url and isinstance(url, str):
+            match = _NETLOC_RE.match(url.strip())
+            if match:
+                logger.debug(f"从site.url获取域名: {match.group(1)}")
+                return match.group(1)
         
-        # 2. 使用site.address字段（MoviePilot中可能存储完整地址）
-        if hasattr(site, 'address') and site.address:
-            try:
-                from urllib.parse import urlparse
-                parsed = urlparse(site.address)
-                if parsed.netloc:
-                    logger.debug(f"从site.address获取域名: {parsed.netloc}")
-                    return parsed.netloc
-            except Exception:
-                # 如果address不是URL格式，可能是域名
-                if site.address and not site.address.startswith(('http://', 'https://')):
-                    logger.debug(f"从site.address获取域名: {site.address}")
-                    return site.address
+        # 2. 使用site.address字段（MoviePilot中可能存储完整地址，也可能只是域名）
+        address = getattr(site, 'address', None)
+        if address and isinstance(address, str):
+            match = _NETLOC_RE.match(address.strip())
+            if match:
+                logger.debug(f"从site.address获取域名: {match.group(1)}")
+                return match.group(1)
         
         # 3. 使用site.domain字段，但检查是否包含前缀
         domain = getattr(site, 'domain', '')
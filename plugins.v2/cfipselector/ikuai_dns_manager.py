@@ -1,73 +1,138 @@
 import hashlib
 import json
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from app.log import logger
 
+# 超过该数量的记录才并发添加，并发数上限避免触发路由器限流
+_PARALLEL_ADD_THRESHOLD = 4
+_MAX_ADD_WORKERS = 8
+# 登录会话超过该时长（秒）主动重新登录；10014 为爱快"未登录"返回码
+_SESSION_MAX_AGE = 20 * 60
+_RESULT_NOT_LOGGED_IN = 10014
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+
+def _json_dumps(obj) -> bytes:
+    """序列化请求体为 bytes，优先使用 orjson"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json_loads(raw: bytes):
+    """解析响应体，优先使用 orjson（其解析异常同样是 ValueError 子类）"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 
 class IkuaiDNSManager:
+    # 添加DNS记录的固定参数，每条记录只需填入域名与IP
+    _DNS_ADD_PARAM = {
+        "comment": "PT云盾优选",
+        "enabled": "yes",
+        "parse_type": "ipv4",
+        "dns_addr_ipv6": "",
+        "dns_addr_proxy": "",
+        "src_addr": ""
+    }
+
     def __init__(self):
         self._ikuai_url: str = ""
+        self._call_url: str = ""
+        self._login_url: str = ""
         self._ikuai_username: str = ""
         self._ikuai_password: str = ""
+        self._password_md5: str = ""
+        self._login_body: bytes = b""
         self._session = None
         self._logged_in = False
+        self._login_ts: float = 0.0
+        self._login_lock = threading.Lock()
         self._last_sync_success: bool = False  # 最后一次同步是否成功的标记
 
     def init_config(self, url: str, username: str, password: str):
         """初始化配置"""
         self._ikuai_url = url.rstrip("/")
+        self._call_url = f"{self._ikuai_url}/Action/call"
+        self._login_url = f"{self._ikuai_url}/Action/login"
         self._ikuai_username = username
         self._ikuai_password = password
+        # 凭据只在这里变化，预先计算摘要并序列化登录请求体
+        self._password_md5 = hashlib.md5(password.encode('utf-8')).hexdigest()
+        self._login_body = _json_dumps(self._get_login_params())
+        self.close()
         self._session = self._create_session()
         self._logged_in = False
 
     def _create_session(self) -> requests.Session:
-        """创建带重试机制的会话"""
+        """创建带重试机制的会话，所有请求复用同一条长连接并共用请求头"""
         session = requests.Session()
         retries = Retry(total=3,
                        backoff_factor=0.5,
                        status_forcelist=[500, 502, 503, 504])
-        session.mount('http://', HTTPAdapter(max_retries=retries))
-        session.mount('https://', HTTPAdapter(max_retries=retries))
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=16, pool_block=False)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Content-Type': 'application/json;charset=UTF-8',
+            'Accept': 'application/json, text/plain, */*',
+            'Origin': self._ikuai_url,
+            'Referer': f"{self._ikuai_url}/"
+        })
         return session
 
+    def close(self):
+        """关闭会话，释放连接池；之后再次登录时会重新创建会话"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        self._logged_in = False
+
     def _get_login_params(self) -> Dict:
         """生成登录参数"""
-        password_md5 = hashlib.md5(self._ikuai_password.encode('utf-8')).hexdigest()
         return {
             "username": self._ikuai_username,
-            "passwd": password_md5
+            "passwd": self._password_md5
         }
 
     def login(self) -> bool:
         """登录爱快路由器"""
-        if self._logged_in:
+        if self._logged_in and time.monotonic() - self._login_ts < _SESSION_MAX_AGE:
             return True
+        if self._session is None:
+            self._session = self._create_session()
 
         try:
-            url = f"{self._ikuai_url}/Action/login"
-            headers = {
-                'Content-Type': 'application/json;charset=UTF-8',
-                'Accept': 'application/json, text/plain, */*',
-                'Origin': self._ikuai_url,
-                'Referer': f"{self._ikuai_url}/"
-            }
-            params = self._get_login_params()
-            logger.debug(f"尝试登录爱快路由器，URL: {url}")
+            logger.debug(f"尝试登录爱快路由器，URL: {self._login_url}")
             
-            response = self._session.post(url, 
-                                       json=params,  # 直接使用json参数
-                                       headers=headers, 
+            response = self._session.post(self._login_url, 
+                                       data=self._login_body,  # 预序列化的登录请求体
                                        timeout=10)
             response.raise_for_status()
             
             try:
-                data = response.json()
+                data = _json_loads(response.content)
                 if data.get("Result", 0) == 10000:
                     self._logged_in = True
+                    self._login_ts = time.monotonic()
                     # 保存登录cookies
                     self._session.cookies.update(response.cookies)
                     logger.info("爱快路由器登录成功")
@@ -75,7 +140,7 @@ class IkuaiDNSManager:
                 else:
                     logger.error(f"爱快路由器登录失败: {data}")
                     return False
-            except json.JSONDecodeError:
+            except ValueError:
                 logger.error("爱快路由器返回的不是有效的JSON响应")
                 return False
 
@@ -83,86 +148,59 @@ class IkuaiDNSManager:
             logger.error(f"爱快路由器登录异常: {str(e)}")
             return False
 
+    def _call(self, payload: Dict) -> Tuple[requests.Response, Optional[Dict]]:
+        """
+        调用 /Action/call 接口，返回响应及解析后的结果（响应不是JSON时为None）
+        会话过期（HTTP 401/403 或 Result=10014）时重新登录并重试一次
+        """
+        body = _json_dumps(payload)
+        for attempt in range(2):
+            login_ts = self._login_ts
+            response = self._session.post(self._call_url, data=body, timeout=10)
+            try:
+                result = _json_loads(response.content)
+            except ValueError:
+                result = None
+            expired = response.status_code in (401, 403) or (
+                isinstance(result, dict) and result.get("Result") == _RESULT_NOT_LOGGED_IN
+            )
+            if not expired or attempt:
+                break
+            with self._login_lock:
+                # 并发请求中只需有一个线程重新登录
+                if self._login_ts == login_ts:
+                    logger.info("爱快路由器会话已过期，重新登录")
+                    self._logged_in = False
+                    if not self.login():
+                        break
+        return response, result
+
     def sync_hosts_to_dns(self, hosts: List[Dict[str, str]]) -> bool:
         """
         将 hosts 同步到爱快路由器的 DNS 服务器
         :param hosts: 列表，每个元素为字典，包含 domain 和 ip
         :return: 是否同步成功
         """
+        if not hosts:
+            return True
+        # 同一域名只保留最后一条，避免重复提交
+        hosts = list({host['domain']: host for host in hosts}.values())
         self._last_sync_success = False  # 重置同步状态
         if not self.login():
             return False
 
         try:
-            # 先删除已存在的相同域名记录
-            for host in hosts:
-                self._delete_existing_dns_record(host['domain'])
-            
-            success_count = 0
-            for host in hosts:
-                try:
-                    domain = host['domain']
-                    ip = host['ip']
-                    
-                    # 转换域名为通配符格式
-                    wildcard_domain = domain
-                    if '.' in domain:
-                        # 获取顶级域名部分，如 m-team.cc 从 kp.m-team.cc
-                        main_domain = '.'.join(domain.split('.')[-2:])
-                        wildcard_domain = f"*.{main_domain}"
-                    
-                    data = {
-                        "func_name": "dns",
-                        "action": "add",
-                        "param": {
-                            "comment": "PT云盾优选",
-                            "dns_addr": ip,
-                            "domain": wildcard_domain,
-                            "enabled": "yes",
-                            "parse_type": "ipv4",
-                            "dns_addr_ipv4": ip,
-                            "dns_addr_ipv6": "",
-                            "dns_addr_proxy": "",
-                            "src_addr": ""
-                        }
-                    }
-                    
-                    url = f"{self._ikuai_url}/Action/call"
-                    headers = {
-                        'Content-Type': 'application/json;charset=UTF-8',
-                        'Accept': 'application/json, text/plain, */*',
-                        'Origin': self._ikuai_url,
-                        'Referer': f"{self._ikuai_url}/"
-                    }
-                    
-                    response = self._session.post(
-                        url,
-                        json=data,
-                        headers=headers,
-                        timeout=10
-                    )
-                    
-                    if response.status_code == 200:
-                        # 清理响应文本，只保留JSON部分
-                        json_text = response.text.split('\n')[0].strip()
-                        try:
-                            result = json.loads(json_text)
-                            if result.get("Result") == 30000:
-                                logger.info(f"成功添加DNS记录: {domain} -> {ip}")
-                                success_count += 1
-                            else:
-                                logger.error(f"添加DNS记录失败: {domain} -> {ip}, 错误: {result}")
-                        except json.JSONDecodeError:
-                            # 如果响应文本包含成功信息，也认为是成功的
-                            if "Success" in response.text and "Result\":30000" in response.text:
-                                logger.info(f"成功添加DNS记录: {domain} -> {ip}")
-                                success_count += 1
-                            else:
-                                logger.error(f"解析DNS记录响应失败: {response.text}")
-                except Exception as e:
-                    logger.error(f"添加单条DNS记录异常: {str(e)}")
-                    continue
+            # 先删除已存在的相同域名记录（只获取一次记录列表，批量删除）
+            self._delete_existing_dns_records([host['domain'] for host in hosts])
             
+            if len(hosts) > _PARALLEL_ADD_THRESHOLD:
+                # 记录较多时并发提交，共享会话的连接池是线程安全的
+                with ThreadPoolExecutor(max_workers=min(_MAX_ADD_WORKERS, len(hosts))) as executor:
+                    results = list(executor.map(self._add_dns_record, hosts))
+            else:
+                results = [self._add_dns_record(host) for host in hosts]
+            success_count = sum(results)
+
             # 如果至少有一条记录添加成功，就认为同步成功
             self._last_sync_success = success_count > 0
             if self._last_sync_success:
@@ -175,54 +213,42 @@ class IkuaiDNSManager:
         except Exception as e:
             logger.error(f"同步 hosts 到爱快路由器 DNS 时发生错误: {str(e)}")
             return False
-            dns_records = []
-            for index, host in enumerate(hosts):
-                dns_records.append({
-                    "id": str(index + 1),
-                    "domain": host["domain"],
-                    "ip": host["ip"],
-                    "enable": "yes",
-                    "comment": "由 PT云盾优选 自动同步"
-                })
 
-            # 获取现有的 DNS 记录
-            existing_records = self._get_dns_records()
+    def _add_dns_record(self, host: Dict[str, str]) -> bool:
+        """添加单条 DNS 记录，返回是否成功"""
+        try:
+            domain = host['domain']
+            ip = host['ip']
             
-            # 合并记录（保留非 PT云盾优选 添加的记录）
-            merged_records = self._merge_dns_records(existing_records, dns_records)
-
-            # 更新 DNS 记录
-            url = f"{self._ikuai_url}/Action/call"
-            headers = {'Content-Type': 'application/json'}
-            payload = {
-                "func_name": "dns",  # 修改为正确的功能名
-                "action": "edit",
-                "param": {
-                    "name": "dns_server",  # 指定DNS服务器配置
-                    "data": merged_records
-                }
-            }
+            # 转换域名为通配符格式
+            wildcard_domain = domain
+            if '.' in domain:
+                # 获取顶级域名部分，如 m-team.cc 从 kp.m-team.cc
+                main_domain = '.'.join(domain.split('.')[-2:])
+                wildcard_domain = f"*.{main_domain}"
             
-            response = self._session.post(url, 
-                                       data=json.dumps(payload), 
-                                       headers=headers, 
-                                       timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            # 检查API响应
-            self._last_sync_success = data.get("Result", 0) == 10000  # 爱快API成功返回码是10000
+            param = self._DNS_ADD_PARAM.copy()
+            param["domain"] = wildcard_domain
+            param["dns_addr"] = param["dns_addr_ipv4"] = ip
+            data = {"func_name": "dns", "action": "add", "param": param}
             
-            if self._last_sync_success:
-                logger.info(f"成功同步 {len(hosts)} 条记录到爱快路由器 DNS")
-                return True
-            else:
-                logger.error(f"同步到爱快路由器 DNS 失败: {data.get('ErrMsg', '未知错误')}")
-                return False
-
+            response, result = self._call(data)
+            
+            if response.status_code == 200:
+                if result is None:
+                    # 响应不是合法JSON时，直接在原始字节上判断是否包含成功码
+                    if b'"Result":30000' in response.content:
+                        logger.info(f"成功添加DNS记录: {domain} -> {ip}")
+                        return True
+                    logger.error(f"解析DNS记录响应失败: {response.text}")
+                    return False
+                if result.get("Result") == 30000:
+                    logger.info(f"成功添加DNS记录: {domain} -> {ip}")
+                    return True
+                logger.error(f"添加DNS记录失败: {domain} -> {ip}, 错误: {result}")
         except Exception as e:
-            logger.error(f"同步 hosts 到爱快路由器 DNS 时发生错误: {str(e)}")
-            return False
+            logger.error(f"添加单条DNS记录异常: {str(e)}")
+        return False
 
     def _get_dns_records(self) -> List[Dict]:
         """获取现有的 DNS 记录"""
@@ -230,13 +256,6 @@ class IkuaiDNSManager:
             return []
             
         try:
-            url = f"{self._ikuai_url}/Action/call"
-            headers = {
-                'Content-Type': 'application/json;charset=UTF-8',
-                'Accept': 'application/json, text/plain, */*',
-                'Origin': self._ikuai_url,
-                'Referer': f"{self._ikuai_url}/"
-            }
             payload = {
                 "func_name": "dns",
                 "action": "show",
@@ -250,14 +269,16 @@ class IkuaiDNSManager:
                 }
             }
             
-            response = self._session.post(url, 
-                                       json=payload, 
-                                       headers=headers, 
-                                       timeout=10)
+            if IJSON_AVAILABLE:
+                records = self._stream_dns_records(payload)
+                if records is not None:
+                    logger.debug(f"成功获取到 {len(records)} 条 DNS 记录")
+                    return records
+            
+            response, result = self._call(payload)
             
             if response.status_code == 200:
-                result = response.json()
-                if result.get("Result") == 30000 and "Data" in result:
+                if result and result.get("Result") == 30000 and "Data" in result:
                     records = result.get("Data", {}).get("data", [])
                     if records:
                         logger.debug(f"成功获取到 {len(records)} 条 DNS 记录")
@@ -276,76 +297,122 @@ class IkuaiDNSManager:
             logger.error(f"获取 DNS 记录失败: {str(e)}")
             return []
 
-    def _delete_existing_dns_record(self, domain: str) -> None:
+    def _stream_dns_records(self, payload: Dict) -> Optional[List[Dict]]:
+        """
+        流式解析 DNS 记录列表，逐条构建记录而不缓冲整个响应体
+        请求失败、会话过期或解析出错时返回 None，由调用方走普通请求（含重新登录）
+        """
+        try:
+            with self._session.post(self._call_url, data=_json_dumps(payload),
+                                    timeout=10, stream=True) as response:
+                if response.status_code != 200:
+                    return None
+                response.raw.decode_content = True
+                result_code = None
+                records = []
+                builder = None
+                for prefix, event, value in ijson.parse(response.raw, use_float=True):
+                    if prefix == "Result":
+                        result_code = value
+                    elif prefix == "Data.data.item" and event == "start_map":
+                        builder = ijson.ObjectBuilder()
+                    if builder is not None:
+                        builder.event(event, value)
+                        if prefix == "Data.data.item" and event == "end_map":
+                            records.append(builder.value)
+                            builder = None
+                return records if result_code == 30000 else None
+        except Exception as e:
+            # 读取response.raw时网络错误以urllib3异常抛出，不经requests包装，统一回退
+            logger.debug(f"流式获取 DNS 记录失败，改用普通请求: {str(e)}")
+            return None
+
+    def _delete_existing_dns_records(self, domains: List[str]) -> None:
         """
-        删除指定域名的已存在DNS记录
-        :param domain: 要删除的域名
+        删除与指定域名匹配的已存在DNS记录
+        只获取一次记录列表，匹配到的记录用一次请求批量删除，批量删除失败时再逐条删除
+        :param domains: 要删除的域名列表
         """
         try:
-            logger.info(f"开始检查并删除已存在的DNS记录: {domain}")
+            logger.info(f"开始检查并删除已存在的DNS记录: {domains}")
             records = self._get_dns_records()
             
             if not records:
                 logger.info("未获取到任何DNS记录")
                 return
             
-            # 检查通配符域名匹配
+            domain_set = set(domains)
+            # 各域名按标签拆出的全部后缀，通配符记录 *.x 只需查 x 是否在集合中
+            suffix_set = set()
+            for domain in domain_set:
+                labels = domain.split(".")
+                suffix_set.update(".".join(labels[i:]) for i in range(len(labels)))
+            record_ids = []
             for record in records:
                 record_domain = record.get("domain", "")
+                record_id = record.get("id")
+                if not record_id:
+                    continue
                 # 检查精确匹配或通配符匹配
-                if record_domain == domain or (
-                    record_domain.startswith("*.") and 
-                    domain.endswith(record_domain[2:])
+                if record_domain in domain_set or (
+                    record_domain.startswith("*.") and record_domain[2:] in suffix_set
                 ):
-                    record_id = record.get("id")
-                    if not record_id:
-                        continue
-                    
                     logger.info(f"找到匹配的记录: ID={record_id}, Pattern={record_domain}, IP={record.get('dns_addr')}, Comment={record.get('comment')}")
-                    
-                    # 删除记录
-                    url = f"{self._ikuai_url}/Action/call"
-                    headers = {
-                        'Content-Type': 'application/json;charset=UTF-8',
-                        'Accept': 'application/json, text/plain, */*',
-                        'Origin': self._ikuai_url,
-                        'Referer': f"{self._ikuai_url}/"
-                    }
-                    delete_data = {
-                        "func_name": "dns",
-                        "action": "del",
-                        "param": {
-                            "id": record_id
-                        }
-                    }
-                    
-                    response = self._session.post(url, json=delete_data, headers=headers, timeout=10)
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result.get("Result") == 30000:
-                            logger.info(f"成功删除DNS记录: {domain} (ID: {record_id})")
-                        else:
-                            logger.error(f"删除DNS记录失败: {domain} (ID: {record_id}), 错误: {result}")
-                    else:
-                        logger.error(f"删除DNS记录请求失败: {response.status_code}")
-                        
-                        
+                    record_ids.append(str(record_id))
+            if not record_ids:
+                return
+            
+            if self._delete_dns_record_ids(",".join(record_ids)):
+                logger.info(f"成功删除DNS记录: {len(record_ids)}条 (ID: {','.join(record_ids)})")
+                return
+            if len(record_ids) > 1:
+                # 部分固件不支持批量删除，退回逐条删除
+                logger.warning("批量删除DNS记录失败，改为逐条删除")
+                for record_id in record_ids:
+                    if self._delete_dns_record_ids(record_id):
+                        logger.info(f"成功删除DNS记录: ID={record_id}")
         except Exception as e:
             logger.error(f"删除DNS记录时发生错误: {str(e)}")
 
-    def _merge_dns_records(self, existing: List[Dict], new: List[Dict]) -> List[Dict]:
+    def _delete_dns_record_ids(self, record_ids: str) -> bool:
         """
-        合并 DNS 记录，保留非 PT云盾优选 添加的记录
+        按ID删除DNS记录，多个ID以逗号分隔
         """
-        # 保留非 PT云盾优选 添加的记录
-        preserved = [
-            record for record in existing
-            if not record.get("comment", "").startswith("由 PT云盾优选 自动同步")
-        ]
-        
-        # 生成新的记录列表，重新编号
-        merged = preserved + new
-        for i, record in enumerate(merged):
-            record["id"] = str(i + 1)
-            
-        return merged
\ No newline at end of file
+        delete_data = {
+            "func_name": "dns",
+            "action": "del",
+            "param": {
+                "id": record_ids
+            }
+        }
+        response, result = self._call(delete_data)
+        if response.status_code != 200:
+            logger.error(f"删除DNS记录请求失败: {response.status_code}")
+            return False
+        if not result or result.get("Result") != 30000:
+            logger.error(f"删除DNS记录失败: (ID: {record_ids}), 错误: {result}")
+            return False
+        return True
+
+
+# 按凭据缓存的共享管理器：(url, username, password) -> 管理器
+_shared_manager: Optional[Tuple[Tuple[str, str, str], IkuaiDNSManager]] = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_dns_manager(url: str, username: str, password: str) -> IkuaiDNSManager:
+    """
+    获取爱快 DNS 管理器，凭据不变时复用同一实例及其连接（插件重载后同样沿用），
+    凭据变化时关闭旧实例的会话后重新创建
+    """
+    global _shared_manager
+    key = (url.rstrip("/"), username, password)
+    with _shared_manager_lock:
+        if _shared_manager and _shared_manager[0] == key:
+            return _shared_manager[1]
+        if _shared_manager:
+            _shared_manager[1].close()
+        manager = IkuaiDNSManager()
+        manager.init_config(url=url, username=username, password=password)
+        _shared_manager = (key, manager)
+        return manager
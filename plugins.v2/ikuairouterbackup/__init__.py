@@ -1,3 +1,4 @@
+import functools
 import threading
 from typing import Any, List, Dict, Tuple, Optional
 
@@ -9,13 +10,9 @@ from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas import NotificationType
 
-from .ip_group.manager import IPGroupManager
-from .ui.form_builder import FormBuilder
 from .notification.service import NotificationManager
 from .notification.ikuai_message_handler import IkuaiMessageHandler
 from .ui.history_manager import HistoryManager
-from .ui.page_builder import PageBuilder
-from .ui.dashboard_builder import DashboardBuilder
 from .backup.backup_manager import BackupManager
 from .config.loader import ConfigLoader
 from .config.manager import ConfigManager
@@ -105,15 +102,17 @@ class IkuaiRouterBackup(_PluginBase):
     _original_ikuai_url: str = ""
     _last_config_hash: str = ""  # 配置哈希值，用于判断是否需要重新初始化
 
+    # 界面构建器只在Web界面请求时按需导入并创建
+    _form_builder = None
+    _page_builder = None
+    _dashboard_builder = None
+
     def init_plugin(self, config: Optional[dict] = None):
         self._lock = threading.Lock()
         # 初始化管理器
-        self._form_builder = FormBuilder(self)  # 初始化表单构建器
         self._notification_manager = NotificationManager(self)  # 初始化通知管理器
         self._ikuai_message_handler = IkuaiMessageHandler(self)  # 初始化爱快消息处理器
         self._history_manager = HistoryManager(self, self._max_history_entries, self._max_restore_history_entries)  # 初始化历史管理器
-        self._page_builder = PageBuilder(self)  # 初始化页面构建器
-        self._dashboard_builder = DashboardBuilder(self)  # 初始化仪表盘构建器
         self._backup_manager = BackupManager(self)  # 初始化备份管理器
         self._config_loader = ConfigLoader(self)  # 初始化配置加载器
         self._config_manager = ConfigManager(self)  # 初始化配置管理器
@@ -127,6 +126,7 @@ class IkuaiRouterBackup(_PluginBase):
         if config:
             # 使用ConfigLoader加载配置
             self._config_loader.load_config(config)
+            self._api_handler.invalidate()
             
             # 使用ConfigManager更新配置
             self._config_manager.update_config()
@@ -188,14 +188,23 @@ class IkuaiRouterBackup(_PluginBase):
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """使用FormBuilder构建表单"""
+        if self._form_builder is None:
+            from .ui.form_builder import FormBuilder
+            self._form_builder = FormBuilder(self)
         return self._form_builder.build_form()
 
     def get_page(self) -> List[dict]:
         """使用PageBuilder构建页面"""
+        if self._page_builder is None:
+            from .ui.page_builder import PageBuilder
+            self._page_builder = PageBuilder(self)
         return self._page_builder.build_page()
     
     def get_dashboard(self, **kwargs) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], List[dict]]]:
         """构建仪表盘 - 显示系统概况和线路监控"""
+        if self._dashboard_builder is None:
+            from .ui.dashboard_builder import DashboardBuilder
+            self._dashboard_builder = DashboardBuilder(self)
         return self._dashboard_builder.build_dashboard(**kwargs)
     
     @eventmanager.register(EventType.PluginAction)
@@ -255,6 +264,7 @@ class IkuaiRouterBackup(_PluginBase):
                 return
 
             logger.info(f"{self.plugin_name} 正在创建IP分组管理器...")
+            from .ip_group.manager import IPGroupManager
             # 创建IP分组管理器
             ip_manager = IPGroupManager(
                 ikuai_url=self._ikuai_url,
@@ -322,6 +332,33 @@ class IkuaiRouterBackup(_PluginBase):
             logger.error(f"{self.plugin_name} {error_msg}")
             return False, error_msg
 
+    def _upload_to_webdav_stream(self, chunks, filename: str) -> Tuple[bool, Optional[str]]:
+        """将数据块迭代器直接上传到WebDAV服务器"""
+        if not self._enable_webdav or not self._webdav_url:
+            return False, "WebDAV未启用或URL未配置"
+        
+        try:
+            from .webdav.webdav_client import WebDAVClient
+            
+            client = WebDAVClient(
+                url=self._webdav_url,
+                username=self._webdav_username,
+                password=self._webdav_password,
+                path=self._webdav_path,
+                skip_dir_check=True,
+                logger=logger,
+                plugin_name=self.plugin_name
+            )
+            success, error = client.upload_stream(chunks, filename)
+            client.close()
+            
+            return success, error
+            
+        except Exception as e:
+            error_msg = f"WebDAV流式上传过程中发生错误: {str(e)}"
+            logger.error(f"{self.plugin_name} {error_msg}")
+            return False, error_msg
+
     def _cleanup_webdav_backups(self):
         """清理WebDAV上的旧备份文件"""
         if not self._enable_webdav or not self._webdav_url or self._webdav_keep_backup_num <= 0:
@@ -451,8 +488,10 @@ class IkuaiRouterBackup(_PluginBase):
             logger.error(f"{self.plugin_name} {error_msg}")
             return False, error_msg
 
-    def _get_processed_ikuai_url(self, url: str) -> str:
-        """返回处理后的iKuai URL，确保有http/https前缀并移除末尾的斜杠"""
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _get_processed_ikuai_url(url: str) -> str:
+        """返回处理后的iKuai URL，确保有http/https前缀并移除末尾的斜杠（结果按原始URL缓存）"""
         url = url.strip().rstrip('/')
         if not url:
             return ""
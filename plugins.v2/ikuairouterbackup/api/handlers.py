@@ -1,7 +1,41 @@
 """API处理模块"""
-from typing import Any, Dict
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
 from app.log import logger
 
+# 省份/城市/运营商选项缓存：键 -> (过期时刻, 返回数据)
+_OPTION_CACHE_TTL = 600
+_OPTION_CACHE_SIZE = 64
+_option_cache: Dict[tuple, Tuple[float, Dict[str, Any]]] = {}
+_option_cache_lock = threading.Lock()
+
+
+def _get_cached_option(key: tuple) -> Optional[Dict[str, Any]]:
+    """读取未过期的选项缓存"""
+    with _option_cache_lock:
+        entry = _option_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+
+def _set_cached_option(key: tuple, payload: Dict[str, Any]):
+    """写入选项缓存，超出容量时淘汰最早写入的条目"""
+    with _option_cache_lock:
+        _option_cache.pop(key, None)
+        if len(_option_cache) >= _OPTION_CACHE_SIZE:
+            _option_cache.pop(next(iter(_option_cache)))
+        _option_cache[key] = (time.monotonic() + _OPTION_CACHE_TTL, payload)
+
+
+@lru_cache(maxsize=8)
+def _get_ip_manager(url: str, username: str, password: str):
+    """按凭据复用IP分组管理器，避免每次请求重复导入和创建"""
+    from ..ip_group.manager import IPGroupManager
+    return IPGroupManager(ikuai_url=url, username=username, password=password)
+
 
 class APIHandler:
     """API处理器类"""
@@ -11,6 +45,21 @@ class APIHandler:
         self.plugin = plugin_instance
         self.plugin_name = plugin_instance.plugin_name
     
+    @staticmethod
+    def invalidate():
+        """配置重新加载后清空IP分组管理器缓存"""
+        _get_ip_manager.cache_clear()
+    
+    @staticmethod
+    def clear_option_cache():
+        """清空省份/城市/运营商选项缓存"""
+        with _option_cache_lock:
+            _option_cache.clear()
+    
+    def _ip_manager(self):
+        """获取当前配置对应的IP分组管理器"""
+        return _get_ip_manager(self.plugin._ikuai_url, self.plugin._ikuai_username, self.plugin._ikuai_password)
+    
     def backup(self, onlyonce: bool = False):
         """API备份接口"""
         try:
@@ -34,13 +83,11 @@ class APIHandler:
             if not self.plugin._ikuai_url or not self.plugin._ikuai_username or not self.plugin._ikuai_password:
                 return {"success": False, "message": "配置不完整：URL、用户名或密码未设置。"}
             
-            # 创建IP分组管理器
-            from ..ip_group.manager import IPGroupManager
-            ip_manager = IPGroupManager(
-                ikuai_url=self.plugin._ikuai_url,
-                username=self.plugin._ikuai_username,
-                password=self.plugin._ikuai_password
-            )
+            # 获取IP分组管理器
+            ip_manager = self._ip_manager()
+            
+            # 同步会重新拉取IP段数据，选项缓存一并失效
+            self.clear_option_cache()
             
             # 执行同步
             success, message = ip_manager.sync_ip_groups_from_22tool(
@@ -61,13 +108,8 @@ class APIHandler:
     def get_ip_blocks_info(self, province: str = "", city: str = "", isp: str = "") -> Dict[str, Any]:
         """API接口：获取IP段信息"""
         try:
-            # 创建IP分组管理器
-            from ..ip_group.manager import IPGroupManager
-            ip_manager = IPGroupManager(
-                ikuai_url=self.plugin._ikuai_url,
-                username=self.plugin._ikuai_username,
-                password=self.plugin._ikuai_password
-            )
+            # 获取IP分组管理器
+            ip_manager = self._ip_manager()
             
             # 获取IP段信息
             ip_blocks = ip_manager.get_ip_blocks_from_22tool(province, city, isp)
@@ -86,22 +128,24 @@ class APIHandler:
     def get_available_options(self) -> Dict[str, Any]:
         """API接口：获取可用的省份、城市、运营商选项"""
         try:
-            # 创建IP分组管理器
-            from ..ip_group.manager import IPGroupManager
-            ip_manager = IPGroupManager(
-                ikuai_url=self.plugin._ikuai_url,
-                username=self.plugin._ikuai_username,
-                password=self.plugin._ikuai_password
-            )
+            cached = _get_cached_option(("opts",))
+            if cached is not None:
+                return cached
+            
+            # 获取IP分组管理器
+            ip_manager = self._ip_manager()
             
             provinces = ip_manager.get_available_provinces()
             isps = ip_manager.get_available_isps()
             
-            return {
+            result = {
                 "success": True,
                 "provinces": provinces,
                 "isps": isps
             }
+            if provinces and isps:
+                _set_cached_option(("opts",), result)
+            return result
             
         except Exception as e:
             error_msg = f"获取可用选项异常: {str(e)}"
@@ -111,20 +155,22 @@ class APIHandler:
     def get_cities_by_province(self, province: str) -> Dict[str, Any]:
         """API接口：根据省份获取城市列表"""
         try:
-            # 创建IP分组管理器
-            from ..ip_group.manager import IPGroupManager
-            ip_manager = IPGroupManager(
-                ikuai_url=self.plugin._ikuai_url,
-                username=self.plugin._ikuai_username,
-                password=self.plugin._ikuai_password
-            )
+            cached = _get_cached_option(("cities", province))
+            if cached is not None:
+                return cached
+            
+            # 获取IP分组管理器
+            ip_manager = self._ip_manager()
             
             cities = ip_manager.get_available_cities(province)
             
-            return {
+            result = {
                 "success": True,
                 "cities": cities
             }
+            if cities:
+                _set_cached_option(("cities", province), result)
+            return result
             
         except Exception as e:
             error_msg = f"获取城市列表异常: {str(e)}"
@@ -140,9 +186,8 @@ class APIHandler:
             if not self.plugin._ikuai_url or not self.plugin._ikuai_username or not self.plugin._ikuai_password:
                 return {"code": 1, "msg": "爱快路由器配置不完整"}
             
-            # 创建IP分组管理器
-            from ..ip_group.manager import IPGroupManager
-            ip_manager = IPGroupManager(self.plugin._ikuai_url, self.plugin._ikuai_username, self.plugin._ikuai_password)
+            # 获取IP分组管理器
+            ip_manager = self._ip_manager()
             
             # 测试创建最简单的IP分组
             success, error = ip_manager.test_create_simple_ip_group()
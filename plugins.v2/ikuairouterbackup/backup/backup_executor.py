@@ -1,6 +1,5 @@
 """备份执行模块"""
 import os
-import json
 import time
 import threading
 from pathlib import Path
@@ -10,6 +9,12 @@ from app.log import logger
 from ..ikuai.client import IkuaiClient
 from ..backup.backup_manager import BackupManager
 
+# 已登录客户端的复用时长（秒），与路由器会话有效期保持一致
+_CLIENT_TTL = 30 * 60
+# 创建备份后轮询备份列表的等待间隔（秒）及总等待上限
+_BACKUP_POLL_DELAYS = (0.3, 0.5, 1.0, 2.0, 2.0)
+_BACKUP_POLL_TIMEOUT = 6
+
 
 class BackupExecutor:
     """备份执行器类"""
@@ -19,9 +24,81 @@ class BackupExecutor:
         self.plugin = plugin_instance
         self.plugin_name = plugin_instance.plugin_name
         self._backup_manager = BackupManager(plugin_instance)
+        # (登录时刻, 凭据, 已登录的客户端)，重试和连续备份时复用连接与会话
+        self._client_cache: Optional[Tuple[float, Tuple[str, str, str], IkuaiClient]] = None
+    
+    def _get_logged_in_client(self) -> Optional[IkuaiClient]:
+        """获取已登录的iKuai客户端，凭据未变且未超过有效期时复用缓存"""
+        key = (self.plugin._ikuai_url, self.plugin._ikuai_username, self.plugin._ikuai_password)
+        if self._client_cache:
+            login_ts, cached_key, cached_client = self._client_cache
+            if cached_key == key and time.monotonic() - login_ts < _CLIENT_TTL:
+                return cached_client
+            cached_client.session.close()
+            self._client_cache = None
+        
+        client = IkuaiClient(
+            url=self.plugin._ikuai_url,
+            username=self.plugin._ikuai_username,
+            password=self.plugin._ikuai_password,
+            plugin_name=self.plugin_name
+        )
+        if not client.login():
+            client.session.close()
+            return None
+        self._client_cache = (time.monotonic(), key, client)
+        return client
+    
+    def _validate_config(self) -> Optional[str]:
+        """检查备份所需配置，返回错误信息，配置有效时返回None"""
+        if not self.plugin._ikuai_url or not self.plugin._ikuai_username or not self.plugin._ikuai_password:
+            return "配置不完整：URL、用户名或密码未设置。"
+        if not self.plugin._backup_path:
+            return "备份路径未配置且无法设置默认路径。"
+        try:
+            Path(self.plugin._backup_path).mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            return f"创建本地备份目录 {self.plugin._backup_path} 失败: {e}"
+        return None
+    
+    @staticmethod
+    def _backup_names(backup_list) -> set:
+        """提取备份列表中的文件名集合"""
+        return {b.get("filename") or b.get("name") for b in backup_list or []} - {None, ""}
+    
+    def _wait_for_new_backup(self, client: IkuaiClient, known_names: set):
+        """
+        创建备份后按递增间隔轮询备份列表，出现新文件名即返回，
+        超时后返回最后一次获取到的列表
+        """
+        deadline = time.monotonic() + _BACKUP_POLL_TIMEOUT
+        backup_list = None
+        for delay in _BACKUP_POLL_DELAYS:
+            delay = min(delay, deadline - time.monotonic())
+            if delay <= 0:
+                break
+            time.sleep(delay)
+            backup_list = client.get_backup_list()
+            if backup_list and self._backup_names(backup_list) - known_names:
+                return backup_list
+        logger.warning(f"{self.plugin_name} 等待新备份出现超时，使用当前备份列表")
+        return backup_list
     
     def run_backup_job(self):
         """执行备份任务（带重试逻辑）"""
+        # 配置无效时直接记录失败，不占用任务锁
+        error_msg = self._validate_config()
+        if error_msg:
+            logger.error(f"{self.plugin_name} {error_msg}")
+            self.plugin._send_notification(success=False, message=error_msg)
+            self.plugin._save_backup_history_entry({
+                "timestamp": time.time(),
+                "success": False,
+                "filename": None,
+                "message": error_msg
+            })
+            return
+        
         if not self.plugin._lock:
             self.plugin._lock = threading.Lock()
         
@@ -40,32 +117,6 @@ class BackupExecutor:
         try:
             self.plugin._running = True
             logger.info(f"开始执行 {self.plugin_name} 任务...")
-
-            if not self.plugin._ikuai_url or not self.plugin._ikuai_username or not self.plugin._ikuai_password:
-                error_msg = "配置不完整：URL、用户名或密码未设置。"
-                logger.error(f"{self.plugin_name} {error_msg}")
-                self.plugin._send_notification(success=False, message=error_msg)
-                history_entry["message"] = error_msg
-                self.plugin._save_backup_history_entry(history_entry)
-                return
-
-            if not self.plugin._backup_path:
-                error_msg = "备份路径未配置且无法设置默认路径。"
-                logger.error(f"{self.plugin_name} {error_msg}")
-                self.plugin._send_notification(success=False, message=error_msg)
-                history_entry["message"] = error_msg
-                self.plugin._save_backup_history_entry(history_entry)
-                return
-
-            try:
-                Path(self.plugin._backup_path).mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                error_msg = f"创建本地备份目录 {self.plugin._backup_path} 失败: {e}"
-                logger.error(f"{self.plugin_name} {error_msg}")
-                self.plugin._send_notification(success=False, message=error_msg)
-                history_entry["message"] = error_msg
-                self.plugin._save_backup_history_entry(history_entry)
-                return
             
             success_final = False
             error_msg_final = "未知错误"
@@ -93,20 +144,23 @@ class BackupExecutor:
             history_entry["success"] = success_final
             history_entry["filename"] = downloaded_file_final
             history_entry["message"] = "备份成功" if success_final else f"备份失败: {error_msg_final}"
-            
-            self.plugin._send_notification(success=success_final, message=history_entry["message"], filename=downloaded_file_final)
                 
         except Exception as e:
             logger.error(f"{self.plugin_name} 任务执行主流程出错：{str(e)}")
+            history_entry["success"] = False
             history_entry["message"] = f"任务执行主流程出错: {str(e)}"
-            self.plugin._send_notification(success=False, message=history_entry["message"])
         finally:
             self.plugin._running = False
             self.plugin._backup_activity = "空闲"
+            # 历史记录只在这里写入一次
             self.plugin._save_backup_history_entry(history_entry)
             if self.plugin._lock and hasattr(self.plugin._lock, 'locked') and self.plugin._lock.locked():
                 try: self.plugin._lock.release()
                 except RuntimeError: pass
+            # 每次任务只在结束时按最终结果发送一条通知，且在释放任务锁之后发送
+            self.plugin._send_notification(success=history_entry["success"],
+                                           message=history_entry["message"],
+                                           filename=history_entry["filename"])
             logger.info(f"{self.plugin_name} 任务执行完成。")
     
     def perform_backup_once(self) -> Tuple[bool, Optional[str], Optional[str]]:
@@ -115,39 +169,35 @@ class BackupExecutor:
         
         :return: (是否成功, 错误信息, 备份文件名)
         """
-        # 初始化iKuai客户端
-        client = IkuaiClient(
-            url=self.plugin._ikuai_url,
-            username=self.plugin._ikuai_username,
-            password=self.plugin._ikuai_password,
-            plugin_name=self.plugin_name
-        )
-        
-        # 登录
-        if not client.login():
+        # 获取已登录的iKuai客户端
+        client = self._get_logged_in_client()
+        if not client:
             return False, "登录爱快路由失败，无法获取SESS_KEY", None
         
+        # 记录创建前已有的备份，用于识别新生成的文件
+        known_names = self._backup_names(client.get_backup_list())
+        
         # 创建备份
         create_success, create_msg = client.create_backup()
         if not create_success:
+            # 会话可能已失效，下次尝试重新登录
+            self._client_cache = None
             return False, f"创建备份失败: {create_msg}", None
         
-        logger.info(f"{self.plugin_name} 成功触发创建备份。等待2秒让备份生成和准备就绪...")
-        time.sleep(2)
+        logger.info(f"{self.plugin_name} 成功触发创建备份。等待备份生成和准备就绪...")
         
         # 获取备份列表
-        backup_list = client.get_backup_list()
+        backup_list = self._wait_for_new_backup(client, known_names)
         if backup_list is None:
             return False, "获取备份文件列表时出错 (在下载前调用)", None
         if not backup_list:
             return False, "路由器上没有找到任何备份文件 (在下载前获取列表为空)", None
         
-        # 兼容新老版本，按 date 字段降序排序，优先取 filename，没有则取 name
+        # 兼容新老版本，按 date 字段取最新一条，优先取 filename，没有则取 name
         def get_date(x):
             # 兼容各种字段名
             return x.get("date") or x.get("backup_time") or ""
-        sorted_backups = sorted(backup_list, key=get_date, reverse=True)
-        latest_backup = sorted_backups[0] if sorted_backups else None
+        latest_backup = max(backup_list, key=get_date, default=None)
         actual_router_filename_from_api = None
         if latest_backup:
             actual_router_filename_from_api = latest_backup.get("filename") or latest_backup.get("name")
@@ -171,11 +221,7 @@ class BackupExecutor:
             if not self.plugin._backup_path:
                 return False, "本地备份已启用但备份路径未配置且无法设置默认路径", None
             
-            try:
-                Path(self.plugin._backup_path).mkdir(parents=True, exist_ok=True)
-            except Exception as e:
-                return False, f"创建本地备份目录失败: {e}", None
-            
+            # 备份目录已在任务开始前的配置校验中创建
             download_success, download_msg = client.download_backup(
                 filename_for_download_url, 
                 str(local_filepath_to_save)
@@ -217,12 +263,13 @@ class BackupExecutor:
             logger.info(f"{self.plugin_name} 尝试向 {export_url} 发送 EXPORT 请求...")
             response = session.post(
                 export_url, 
-                data=json.dumps(export_payload), 
-                headers={'Content-Type': 'application/json'}, 
+                json=export_payload, 
                 timeout=10
             )
             response.raise_for_status()
-            logger.info(f"{self.plugin_name} EXPORT 请求发送成功。响应: {response.text[:200]}")
+            logger.info(f"{self.plugin_name} EXPORT 请求发送成功，状态码: {response.status_code}")
+            # 响应内容只截取前200字节解码，不对整个响应体做文本解码
+            logger.debug(f"{self.plugin_name} EXPORT 响应: {response.content[:200].decode('utf-8', 'replace')}")
             return True
         except Exception as e:
             logger.error(f"{self.plugin_name} EXPORT请求失败: {e}")
@@ -236,7 +283,13 @@ class BackupExecutor:
                 # 使用已下载的文件上传
                 webdav_success, webdav_msg = self.plugin._upload_to_webdav(local_filepath, local_filename)
             else:
-                # 下载到临时文件再上传
+                # 直接把路由器的下载响应转发到WebDAV，不经过本地磁盘
+                webdav_success, webdav_msg = self.plugin._upload_to_webdav_stream(
+                    client.stream_backup(router_filename), local_filename)
+            
+            if not local_backup_enabled and not webdav_success:
+                # 部分WebDAV服务器不接受分块传输，退回先下载到临时文件再上传
+                logger.warning(f"{self.plugin_name} WebDAV流式上传失败，改为经临时文件上传: {webdav_msg}")
                 temp_dir = Path(self.plugin.get_data_path()) / "temp"
                 temp_dir.mkdir(parents=True, exist_ok=True)
                 temp_filepath = temp_dir / local_filename
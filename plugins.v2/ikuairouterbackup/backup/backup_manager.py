@@ -1,12 +1,23 @@
 """备份管理器模块"""
+import heapq
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any, List, Dict
 from pathlib import Path
 from app.log import logger
 
+# 备份文件名中的时间戳，如 20240101_120000 或 20240101120000
+_TS_RE = re.compile(r'(\d{8}_?\d{6})')
+_TS_FORMAT = '%Y%m%d%H%M%S'
+
+
+def _backup_time(backup: Dict[str, Any]) -> float:
+    """备份列表的排序键"""
+    return backup['time']
+
 
 class BackupManager:
     """备份管理器类"""
@@ -27,26 +38,29 @@ class BackupManager:
                 return
 
             files = []
-            for f_path_obj in backup_dir.iterdir():
-                if f_path_obj.is_file() and f_path_obj.suffix.lower() == ".bak":
+            # scandir 的目录项自带文件类型，先按文件名过滤，只有需要时才取 stat
+            with os.scandir(backup_dir) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(".bak") or not entry.is_file():
+                        continue
                     try:
-                        match = re.search(r'(\d{4}\d{2}\d{2}[_]?\d{2}\d{2}\d{2})', f_path_obj.stem)
+                        match = _TS_RE.search(entry.name[:-4])
                         file_time = None
                         if match:
                             time_str = match.group(1).replace('_','')
                             try:
-                                file_time = datetime.strptime(time_str, '%Y%m%d%H%M%S').timestamp()
+                                file_time = datetime.strptime(time_str, _TS_FORMAT).timestamp()
                             except ValueError:
                                 pass 
                         if file_time is None:
-                           file_time = f_path_obj.stat().st_mtime
-                        files.append({'path': f_path_obj, 'name': f_path_obj.name, 'time': file_time})
+                           file_time = entry.stat().st_mtime
+                        files.append({'path': entry.path, 'name': entry.name, 'time': file_time})
                     except Exception as e:
-                        logger.error(f"{self.plugin_name} 处理文件 {f_path_obj.name} 时出错: {e}")
+                        logger.error(f"{self.plugin_name} 处理文件 {entry.name} 时出错: {e}")
                         try:
-                            files.append({'path': f_path_obj, 'name': f_path_obj.name, 'time': f_path_obj.stat().st_mtime})
+                            files.append({'path': entry.path, 'name': entry.name, 'time': entry.stat().st_mtime})
                         except Exception as stat_e:
-                            logger.error(f"{self.plugin_name} 无法获取文件状态 {f_path_obj.name}: {stat_e}")
+                            logger.error(f"{self.plugin_name} 无法获取文件状态 {entry.name}: {stat_e}")
 
             files.sort(key=lambda x: x['time'], reverse=True)
             
@@ -55,7 +69,7 @@ class BackupManager:
                 logger.info(f"{self.plugin_name} 找到 {len(files_to_delete)} 个旧 .bak 备份文件需要删除。")
                 for f_info in files_to_delete:
                     try:
-                        f_info['path'].unlink()
+                        Path(f_info['path']).unlink()
                         logger.info(f"{self.plugin_name} 已删除旧备份文件: {f_info['name']}")
                     except OSError as e:
                         logger.error(f"{self.plugin_name} 删除旧备份文件 {f_info['name']} 失败: {e}")
@@ -64,63 +78,81 @@ class BackupManager:
         except Exception as e:
             logger.error(f"{self.plugin_name} 清理旧备份文件时发生错误: {e}")
     
-    def get_available_backups(self) -> List[Dict[str, Any]]:
-        """获取可用的备份文件列表"""
+    def _list_local_backups(self) -> List[Dict[str, Any]]:
+        """获取本地备份文件列表"""
         backups = []
+        if not (self.plugin._enable_local_backup and self.plugin._backup_path):
+            return backups
+        try:
+            backup_dir = Path(self.plugin._backup_path)
+            if backup_dir.is_dir():
+                with os.scandir(backup_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.lower().endswith(".bak") or not entry.is_file():
+                            continue
+                        try:
+                            file_time = entry.stat().st_mtime
+                            backups.append({
+                                'filename': entry.name,
+                                'source': '本地备份',
+                                'time': file_time
+                            })
+                        except Exception as e:
+                            logger.error(f"{self.plugin_name} 处理本地备份文件 {entry.name} 时出错: {e}")
+        except Exception as e:
+            logger.error(f"{self.plugin_name} 获取本地备份文件列表时发生错误: {str(e)}")
+        backups.sort(key=_backup_time, reverse=True)
+        return backups
+    
+    def _list_webdav_backups(self) -> List[Dict[str, Any]]:
+        """获取WebDAV备份文件列表"""
+        backups = []
+        if not (self.plugin._enable_webdav and self.plugin._webdav_url):
+            return backups
+        try:
+            from ..webdav.webdav_client import WebDAVClient
+            
+            # 创建WebDAV客户端
+            client = WebDAVClient(
+                url=self.plugin._webdav_url,
+                username=self.plugin._webdav_username,
+                password=self.plugin._webdav_password,
+                path=self.plugin._webdav_path,
+                skip_dir_check=True,
+                logger=logger,
+                plugin_name=self.plugin_name
+            )
+            
+            # 获取文件列表（只获取.bak文件）
+            files, error = client.list_files('.bak')
+            client.close()
+            
+            if error:
+                logger.error(f"{self.plugin_name} 获取WebDAV备份文件列表失败: {error}")
+            else:
+                for file_info in files:
+                    backups.append({
+                        'filename': file_info['filename'],
+                        'source': 'WebDAV备份',
+                        'time': file_info['time']
+                    })
+                    
+        except Exception as e:
+            logger.error(f"{self.plugin_name} 获取WebDAV备份文件列表时发生错误: {str(e)}")
+        backups.sort(key=_backup_time, reverse=True)
+        return backups
+    
+    def get_available_backups(self) -> List[Dict[str, Any]]:
+        """获取可用的备份文件列表，按时间从新到旧排列"""
+        if not (self.plugin._enable_webdav and self.plugin._webdav_url):
+            return self._list_local_backups()
         
-        # 获取本地备份
-        if self.plugin._enable_local_backup and self.plugin._backup_path:
-            try:
-                backup_dir = Path(self.plugin._backup_path)
-                if backup_dir.is_dir():
-                    for f_path_obj in backup_dir.iterdir():
-                        if f_path_obj.is_file() and f_path_obj.suffix.lower() == ".bak":
-                            try:
-                                file_time = f_path_obj.stat().st_mtime
-                                backups.append({
-                                    'filename': f_path_obj.name,
-                                    'source': '本地备份',
-                                    'time': file_time
-                                })
-                            except Exception as e:
-                                logger.error(f"{self.plugin_name} 处理本地备份文件 {f_path_obj.name} 时出错: {e}")
-            except Exception as e:
-                logger.error(f"{self.plugin_name} 获取本地备份文件列表时发生错误: {str(e)}")
-        
-        # 获取WebDAV备份
-        if self.plugin._enable_webdav and self.plugin._webdav_url:
-            try:
-                from ..webdav.webdav_client import WebDAVClient
-                
-                # 创建WebDAV客户端
-                client = WebDAVClient(
-                    url=self.plugin._webdav_url,
-                    username=self.plugin._webdav_username,
-                    password=self.plugin._webdav_password,
-                    path=self.plugin._webdav_path,
-                    skip_dir_check=True,
-                    logger=logger,
-                    plugin_name=self.plugin_name
-                )
-                
-                # 获取文件列表（只获取.bak文件）
-                files, error = client.list_files('.bak')
-                client.close()
-                
-                if error:
-                    logger.error(f"{self.plugin_name} 获取WebDAV备份文件列表失败: {error}")
-                else:
-                    for file_info in files:
-                        backups.append({
-                            'filename': file_info['filename'],
-                            'source': 'WebDAV备份',
-                            'time': file_info['time']
-                        })
-                        
-            except Exception as e:
-                logger.error(f"{self.plugin_name} 获取WebDAV备份文件列表时发生错误: {str(e)}")
+        # 本地扫描与WebDAV列表互不依赖，同时进行
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            local_future = executor.submit(self._list_local_backups)
+            webdav_future = executor.submit(self._list_webdav_backups)
+            local_backups = local_future.result()
+            webdav_backups = webdav_future.result()
         
-        # 按时间排序
-        backups.sort(key=lambda x: x['time'], reverse=True)
-        return backups
-
+        # 两个来源各自已按时间排好序，归并即可
+        return list(heapq.merge(local_backups, webdav_backups, key=_backup_time, reverse=True))
@@ -6,6 +6,7 @@ from app.log import logger
 from app.core.event import eventmanager, Event
 from app.schemas.types import EventType
 from app.schemas import NotificationType
+from collections import OrderedDict
 import time
 
 
@@ -19,9 +20,10 @@ class IkuaiEventHandler:
         """
         self.ikuai_plugin = ikuai_plugin_instance
         self.ikuai_plugin_name = ikuai_plugin_instance.plugin_name
-        # 用于防止重复处理同一个事件
-        self._ikuai_processed_events = set()
+        # 用于防止重复处理同一个事件：事件标识 -> 记录时刻（monotonic），按记录顺序排列
+        self._ikuai_processed_events = OrderedDict()
         self._ikuai_event_cache_ttl = 5  # 5秒内的重复事件将被忽略
+        self._ikuai_event_cache_size = 256  # 最多记录的事件数量
     
     def _ikuai_is_our_command(self, event_data: dict) -> bool:
         """
@@ -83,14 +85,12 @@ class IkuaiEventHandler:
         检查事件是否已被处理过（防止重复处理）
         """
         current_time = time.time()
+        now = time.monotonic()
         
-        # 定期清理过期的事件缓存
-        if hasattr(self, '_ikuai_event_cache_time'):
-            if current_time - self._ikuai_event_cache_time > self._ikuai_event_cache_ttl:
-                self._ikuai_processed_events.clear()
-                self._ikuai_event_cache_time = current_time
-        if not hasattr(self, '_ikuai_event_cache_time'):
-            self._ikuai_event_cache_time = current_time
+        # 从最早记录的一端淘汰过期事件，未过期的记录保留
+        processed = self._ikuai_processed_events
+        while processed and now - next(iter(processed.values())) > self._ikuai_event_cache_ttl:
+            processed.popitem(last=False)
         
         # 尝试从事件中提取唯一标识
         event_data = None
@@ -115,10 +115,12 @@ class IkuaiEventHandler:
             else:
                 event_key = f"ikuai_unknown_{hash(str(event))}"
         
-        if event_key in self._ikuai_processed_events:
+        if event_key in processed:
             return True
         
-        self._ikuai_processed_events.add(event_key)
+        processed[event_key] = now
+        if len(processed) > self._ikuai_event_cache_size:
+            processed.popitem(last=False)
         logger.debug(f"{self.ikuai_plugin_name} 记录新爱快事件: key={event_key}")
         return False
     
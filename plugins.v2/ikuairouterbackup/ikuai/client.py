@@ -3,7 +3,7 @@ import hashlib
 import json
 import re
 import time
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, Iterator, List, Tuple
 from urllib.parse import urljoin, quote
 
 import requests
@@ -36,8 +36,9 @@ class IkuaiClient:
         """初始化Session"""
         self.session = requests.Session()
         retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
-        self.session.mount('http://', HTTPAdapter(max_retries=retries))
-        self.session.mount('https://', HTTPAdapter(max_retries=retries))
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
         # 统一的User-Agent
         browser_user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36 Edg/136.0.0.0"
@@ -268,6 +269,23 @@ class IkuaiClient:
             logger.error(f"{self.plugin_name} 下载 {router_filename} 从 {download_url} 过程中发生未知错误: {error}")
             return False, error
     
+    def stream_backup(self, router_filename: str, chunk_size: int = 65536) -> Iterator[bytes]:
+        """
+        流式读取备份文件内容，不写入本地磁盘
+        
+        :param router_filename: 路由器上的文件名
+        :param chunk_size: 每次读取的字节数
+        :return: 文件内容块迭代器，请求失败时在迭代过程中抛出异常
+        """
+        download_url = urljoin(self.url, f"/Action/download?filename={quote(router_filename)}")
+        request_headers = {
+            "Referer": self.url.rstrip('/') + "/",
+            "Accept": "*/*",
+        }
+        with self.session.get(download_url, stream=True, timeout=300, headers=request_headers) as r:
+            r.raise_for_status()
+            yield from r.iter_content(chunk_size=chunk_size)
+    
     def restore_backup(self, filename: str, backup_content: bytes) -> Tuple[bool, Optional[str]]:
         """
         恢复备份
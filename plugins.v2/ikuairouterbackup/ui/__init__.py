@@ -2,9 +2,18 @@
 UI界面模块
 包含表单、页面构建和历史记录管理
 """
-from .form_builder import FormBuilder
-from .page_builder import PageBuilder
 from .history_manager import HistoryManager
 
 __all__ = ['FormBuilder', 'PageBuilder', 'HistoryManager']
 
+
+def __getattr__(name):
+    # 表单与页面构建器体积较大，首次访问时才导入
+    if name == 'FormBuilder':
+        from .form_builder import FormBuilder
+        return FormBuilder
+    if name == 'PageBuilder':
+        from .page_builder import PageBuilder
+        return PageBuilder
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
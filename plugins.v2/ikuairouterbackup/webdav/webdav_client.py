@@ -14,6 +14,26 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 
+class _ProgressFile:
+    """
+    上传用的文件包装：提供长度以便发送Content-Length，
+    由底层连接按自身块大小调用read流式读取，每次读取后回调已读字节数
+    """
+
+    def __init__(self, file_obj, size: int, on_read):
+        self._file = file_obj
+        self._size = size
+        self._on_read = on_read
+
+    def __len__(self) -> int:
+        return self._size
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._file.read(size)
+        self._on_read(len(chunk))
+        return chunk
+
+
 class WebDAVClient:
     """标准WebDAV客户端"""
     
@@ -206,18 +226,6 @@ class WebDAVClient:
         file_size = os.path.getsize(local_file_path)
         file_size_mb = file_size / (1024 * 1024)
         
-        # 根据文件大小选择块大小
-        if file_size < 100 * 1024 * 1024:  # < 100MB
-            chunk_size = 16 * 1024 * 1024  # 16MB
-        elif file_size < 500 * 1024 * 1024:  # < 500MB
-            chunk_size = 32 * 1024 * 1024  # 32MB
-        elif file_size < 5 * 1024 * 1024 * 1024:  # < 5GB
-            chunk_size = 64 * 1024 * 1024  # 64MB
-        elif file_size < 50 * 1024 * 1024 * 1024:  # < 50GB
-            chunk_size = 128 * 1024 * 1024  # 128MB
-        else:  # >= 50GB
-            chunk_size = 256 * 1024 * 1024  # 256MB
-        
         # 构建上传URL
         upload_url = self._build_upload_url(filename)
         
@@ -230,7 +238,7 @@ class WebDAVClient:
                 size_display = f"{file_size_gb:.2f}GB ({file_size_mb:.2f}MB)"
             else:
                 size_display = f"{file_size_mb:.2f}MB"
-            self.logger.info(f"{self.plugin_name} 准备上传文件: {filename}, 大小: {size_display}, 块大小: {chunk_size / 1024 / 1024:.0f}MB")
+            self.logger.info(f"{self.plugin_name} 准备上传文件: {filename}, 大小: {size_display}")
         
         # 流式上传
         try:
@@ -241,87 +249,84 @@ class WebDAVClient:
             
             data_sent_complete = [False]  # 标记数据是否发送完成
             
-            def file_generator():
-                with open(local_file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            # 数据发送完成
-                            if not data_sent_complete[0] and self.logger:
-                                self.logger.info(f"{self.plugin_name} 数据已全部发送，等待服务器确认...")
-                                data_sent_complete[0] = True
-                            break
-                        
-                        uploaded_size[0] += len(chunk)
-                        current_time = time.time()
-                        
-                        # 计算进度和速度
-                        if file_size > 0:
-                            progress = (uploaded_size[0] / file_size) * 100
-                            elapsed_time = current_time - start_time
-                            
-                            # 计算平均速度
-                            if elapsed_time > 0:
-                                avg_speed = uploaded_size[0] / elapsed_time / 1024 / 1024  # MB/s
-                            else:
-                                avg_speed = 0
-                            
-                            # 进度报告逻辑：
-                            # - 0-90%: 每10%报告一次
-                            # - 90-100%: 每5%或更小间隔报告（90%, 95%, 97%, 99%, 99.5%, 99.9%, 100%）
-                            # - 或者每30秒报告一次（确保长时间上传也有反馈）
-                            time_since_report = current_time - last_report_time[0]
-                            
-                            # 根据进度范围决定报告节点
-                            report_progress = None
-                            if progress < 90:
-                                # 0-90%: 每10%
-                                report_progress = int(progress / 10) * 10
-                            elif progress >= 90 and last_progress[0] < 90:
-                                report_progress = 90
-                            elif progress >= 95 and last_progress[0] < 95:
-                                report_progress = 95
-                            elif progress >= 97 and last_progress[0] < 97:
-                                report_progress = 97
-                            elif progress >= 99 and last_progress[0] < 99:
-                                report_progress = 99
-                            elif progress >= 99.5 and last_progress[0] < 99.5:
-                                report_progress = 99.5
-                            elif progress >= 99.9 and last_progress[0] < 99.9:
-                                report_progress = 99.9
-                            elif progress >= 99.9:
-                                # 99.9%之后显示实际进度（保留1位小数）
-                                report_progress = round(progress, 1)
-                            
-                            # 判断是否需要报告
-                            should_report = False
-                            if report_progress is not None:
-                                # 到达了新的报告节点
-                                should_report = report_progress > last_progress[0]
-                            # 或者超过30秒没有报告（使用实际进度）
-                            if not should_report and time_since_report >= 30:
-                                should_report = True
-                                report_progress = round(progress, 1)
-                            
-                            if should_report and progress_callback:
-                                progress_callback(uploaded_size[0], file_size, avg_speed)
-                                last_report_time[0] = current_time
-                                if report_progress is not None and report_progress > last_progress[0]:
-                                    last_progress[0] = report_progress
-                            
-                        yield chunk
+            def on_read(n: int):
+                if not n:
+                    # 数据发送完成
+                    if not data_sent_complete[0] and self.logger:
+                        self.logger.info(f"{self.plugin_name} 数据已全部发送，等待服务器确认...")
+                        data_sent_complete[0] = True
+                    return
+                
+                uploaded_size[0] += n
+                current_time = time.time()
+                
+                # 计算进度和速度
+                if file_size > 0:
+                    progress = (uploaded_size[0] / file_size) * 100
+                    elapsed_time = current_time - start_time
+                    
+                    # 计算平均速度
+                    if elapsed_time > 0:
+                        avg_speed = uploaded_size[0] / elapsed_time / 1024 / 1024  # MB/s
+                    else:
+                        avg_speed = 0
+                    
+                    # 进度报告逻辑：
+                    # - 0-90%: 每10%报告一次
+                    # - 90-100%: 每5%或更小间隔报告（90%, 95%, 97%, 99%, 99.5%, 99.9%, 100%）
+                    # - 或者每30秒报告一次（确保长时间上传也有反馈）
+                    time_since_report = current_time - last_report_time[0]
+                    
+                    # 根据进度范围决定报告节点
+                    report_progress = None
+                    if progress < 90:
+                        # 0-90%: 每10%
+                        report_progress = int(progress / 10) * 10
+                    elif progress >= 90 and last_progress[0] < 90:
+                        report_progress = 90
+                    elif progress >= 95 and last_progress[0] < 95:
+                        report_progress = 95
+                    elif progress >= 97 and last_progress[0] < 97:
+                        report_progress = 97
+                    elif progress >= 99 and last_progress[0] < 99:
+                        report_progress = 99
+                    elif progress >= 99.5 and last_progress[0] < 99.5:
+                        report_progress = 99.5
+                    elif progress >= 99.9 and last_progress[0] < 99.9:
+                        report_progress = 99.9
+                    elif progress >= 99.9:
+                        # 99.9%之后显示实际进度（保留1位小数）
+                        report_progress = round(progress, 1)
+                    
+                    # 判断是否需要报告
+                    should_report = False
+                    if report_progress is not None:
+                        # 到达了新的报告节点
+                        should_report = report_progress > last_progress[0]
+                    # 或者超过30秒没有报告（使用实际进度）
+                    if not should_report and time_since_report >= 30:
+                        should_report = True
+                        report_progress = round(progress, 1)
+                    
+                    if should_report and progress_callback:
+                        progress_callback(uploaded_size[0], file_size, avg_speed)
+                        last_report_time[0] = current_time
+                        if report_progress is not None and report_progress > last_progress[0]:
+                            last_progress[0] = report_progress
+                    
             
-            # 执行PUT请求（标准WebDAV方法）
-            response = session.put(
-                upload_url,
-                data=file_generator(),
-                headers={
-                    'Content-Type': 'application/octet-stream',
-                    'User-Agent': 'MoviePilot/1.0'
-                },
-                timeout=timeout,
-                verify=False
-            )
+            # 执行PUT请求（标准WebDAV方法），文件对象直接作为请求体从磁盘流式读取
+            with open(local_file_path, 'rb') as f:
+                response = session.put(
+                    upload_url,
+                    data=_ProgressFile(f, file_size, on_read),
+                    headers={
+                        'Content-Type': 'application/octet-stream',
+                        'User-Agent': 'MoviePilot/1.0'
+                    },
+                    timeout=timeout,
+                    verify=False
+                )
             
             # 检查响应
             if response.status_code in [200, 201, 204]:
@@ -339,25 +344,18 @@ class WebDAVClient:
                 return False, error_msg
             elif response.status_code == 409:
                 # 文件冲突，尝试使用Overwrite头重新上传
-                def file_generator_with_overwrite():
-                    with open(local_file_path, 'rb') as f:
-                        while True:
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            yield chunk
-                
-                response = session.put(
-                    upload_url,
-                    data=file_generator_with_overwrite(),
-                    headers={
-                        'Content-Type': 'application/octet-stream',
-                        'User-Agent': 'MoviePilot/1.0',
-                        'Overwrite': 'T'
-                    },
-                    timeout=timeout,
-                    verify=False
-                )
+                with open(local_file_path, 'rb') as f:
+                    response = session.put(
+                        upload_url,
+                        data=f,
+                        headers={
+                            'Content-Type': 'application/octet-stream',
+                            'User-Agent': 'MoviePilot/1.0',
+                            'Overwrite': 'T'
+                        },
+                        timeout=timeout,
+                        verify=False
+                    )
                 if response.status_code in [200, 201, 204]:
                     if self.logger:
                         self.logger.info(f"{self.plugin_name} 文件上传成功（覆盖）: {filename}")
@@ -372,6 +370,61 @@ class WebDAVClient:
         except Exception as e:
             return False, f"上传过程中发生错误: {str(e)}"
     
+    def upload_stream(self, chunks, filename: str) -> Tuple[bool, Optional[str]]:
+        """
+        将数据块迭代器直接上传到WebDAV（分块传输编码），无需先写入本地文件
+        
+        :param chunks: 文件内容块迭代器
+        :param filename: 远程文件名
+        :return: (成功, 错误信息)
+        """
+        session = self._get_session()
+        if not session:
+            return False, "无法建立WebDAV连接"
+        
+        create_success, create_error = self._create_directories()
+        if not create_success and self.logger:
+            self.logger.warning(f"{self.plugin_name} 创建目录失败，继续尝试上传: {create_error}")
+        
+        upload_url = self._build_upload_url(filename)
+        # 记录数据源是否完整读完：数据源中途出错时连接会被重试，
+        # 重试时迭代器已耗尽，服务器可能收到不完整的文件并返回成功
+        source_state = {"complete": False, "error": None}
+        
+        def body():
+            try:
+                yield from chunks
+            except Exception as err:
+                source_state["error"] = err
+                raise
+            source_state["complete"] = True
+        
+        try:
+            start_time = time.time()
+            response = session.put(
+                upload_url,
+                data=body(),
+                headers={
+                    'Content-Type': 'application/octet-stream',
+                    'User-Agent': 'MoviePilot/1.0',
+                    'Overwrite': 'T'
+                },
+                timeout=None,
+                verify=False
+            )
+            if not source_state["complete"]:
+                self.delete_file(filename)
+                return False, f"读取上传数据失败: {source_state['error']}"
+            if response.status_code in [200, 201, 204]:
+                if self.logger:
+                    self.logger.info(f"{self.plugin_name} 文件流式上传成功: {filename}, 耗时: {time.time() - start_time:.1f}秒")
+                return True, None
+            return False, f"上传失败，状态码: {response.status_code}"
+        except Exception as e:
+            if source_state["error"] is not None:
+                self.delete_file(filename)
+            return False, f"上传过程中发生错误: {str(e)}"
+    
     def list_files(self, pattern: str = None) -> Tuple[List[Dict], Optional[str]]:
         """
         列出WebDAV目录中的文件